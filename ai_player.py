@@ -1,14 +1,577 @@
+import math
 import random
+import time
+import numpy as np
+import batch_logic
+from game_logic import get_moves, get_flips, popcount, iter_squares, FULL_MASK
+from transposition import shared_table, EXACT, LOWER, UPPER, NO_MOVE
+from opening_book import get_book
+
+# Seconds of search per move for each difficulty; None means BeginnerAI
+AI_LEVELS = {
+    'beginner': None,
+    'easy': 0.1,
+    'medium': 0.4,
+    'hard': 1.0,
+    'monte_carlo': 1.0,
+}
+
+# Levels played by MCTSAI rather than AlphaBetaAI
+MCTS_LEVELS = ('monte_carlo',)
+
+# Empty squares at which each level switches to the exact endgame solver
+ENDGAME_EMPTIES = {
+    'easy': 8,
+    'medium': 10,
+    'hard': 12,
+}
+
+AI_LEVEL_NAMES = {
+    'beginner': 'Beginner',
+    'easy': 'Easy',
+    'medium': 'Medium',
+    'hard': 'Hard',
+    'monte_carlo': 'Monte Carlo',
+}
+
+SQUARE_WEIGHTS = [
+    100, -20, 10,  5,  5, 10, -20, 100,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+     10,  -2, -1, -1, -1, -1,  -2,  10,
+      5,  -2, -1, -1, -1, -1,  -2,   5,
+      5,  -2, -1, -1, -1, -1,  -2,   5,
+     10,  -2, -1, -1, -1, -1,  -2,  10,
+    -20, -50, -2, -2, -2, -2, -50, -20,
+    100, -20, 10,  5,  5, 10, -20, 100,
+]
+
+# Squares grouped by weight so the positional score is a handful of popcounts
+WEIGHT_MASKS = {}
+for _square, _weight in enumerate(SQUARE_WEIGHTS):
+    WEIGHT_MASKS[_weight] = WEIGHT_MASKS.get(_weight, 0) | 1 << _square
+WEIGHT_MASKS = tuple(WEIGHT_MASKS.items())
+
+CORNERS = 0x8100000000000081
+MOBILITY_WEIGHT = 8
+# A finished game is scored per disc, above anything evaluate() can return
+FINAL_SCALE = 10000
+INFINITY = 65 * FINAL_SCALE
+
+# How often, in nodes, the search looks at the clock
+TIME_CHECK_INTERVAL = 64
+
+# Share of the move budget the endgame solver may use before falling back
+# to the heuristic search for the remaining time
+ENDGAME_BUDGET_SHARE = 0.75
+# Above this many empties the solver orders moves fastest-first (fewest
+# opponent replies); below it the cheaper parity ordering is used
+FASTEST_FIRST_EMPTIES = 7
+
+QUADRANTS = (
+    0x000000000F0F0F0F,
+    0x00000000F0F0F0F0,
+    0x0F0F0F0F00000000,
+    0xF0F0F0F000000000,
+)
+QUADRANT_OF = [
+    next(quadrant for quadrant in QUADRANTS if quadrant >> square & 1)
+    for square in range(64)
+]
+
+class SearchTimeout(Exception):
+    pass
 
 class BeginnerAI:
     def __init__(self, player_color):
         self.player_color = player_color
         self.name = "🤖 AI"
-    
+
     def make_move(self, game_logic):
         valid_moves = game_logic.get_valid_moves(self.player_color)
-        
+
         if not valid_moves:
             return None
-        
+
         return random.choice(valid_moves)
+
+class AlphaBetaAI:
+    """Negamax alpha-beta with iterative deepening under a per-move time budget"""
+
+    def __init__(self, player_color, time_budget, table=shared_table, endgame_empties=0, name="🤖 AI"):
+        self.player_color = player_color
+        self.time_budget = time_budget
+        self.table = table
+        self.endgame_empties = endgame_empties
+        self.endgame = EndgameSolver()
+        self.name = name
+        self.nodes = 0
+        self.deadline = 0
+        self.last_score = 0
+
+    def make_move(self, game_logic):
+        moves = game_logic.get_moves_mask(self.player_color)
+        if not moves:
+            return None
+
+        game = game_logic.copy()
+        game.current_player = self.player_color
+
+        book = get_book()
+        if book:
+            entry = book.lookup(game.hash)
+            if entry and moves >> entry[0] & 1:
+                square, self.last_score = entry
+                return square >> 3, square & 7
+
+        square = self.search(game)
+        return square >> 3, square & 7
+
+    def search(self, game):
+        start = time.monotonic()
+        self.deadline = start + self.time_budget
+        self.nodes = 0
+
+        if game.get_empty_count() <= self.endgame_empties:
+            try:
+                square, score = self.endgame.solve_root(game, start + self.time_budget * ENDGAME_BUDGET_SHARE)
+                self.last_score = score * FINAL_SCALE
+                return square
+            except SearchTimeout:
+                pass
+
+        self.table.new_search()
+
+        moves = game.get_moves_mask(game.current_player)
+        best_move = self.order_moves(game, moves, NO_MOVE, 0)[0]
+
+        for depth in range(1, game.get_empty_count() + 1):
+            try:
+                best_move = self.search_root(game, depth, best_move)
+            except SearchTimeout:
+                break
+            if time.monotonic() >= self.deadline:
+                break
+
+        return best_move
+
+    def search_root(self, game, depth, previous_best):
+        player = game.current_player
+        moves = game.get_moves_mask(player)
+        alpha = -INFINITY
+        best_move = previous_best
+
+        for square in self.order_moves(game, moves, previous_best, depth):
+            record = game.make_move_square(square, player)
+            if game.current_player == player:
+                score = self.negamax(game, depth - 1, alpha, INFINITY)
+            else:
+                score = -self.negamax(game, depth - 1, -INFINITY, -alpha)
+            game.unmake_move(record)
+
+            if score > alpha:
+                alpha = score
+                best_move = square
+
+        self.table.store(game.hash, depth, EXACT, alpha, best_move)
+        self.last_score = alpha
+        return best_move
+
+    def negamax(self, game, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.monotonic() >= self.deadline:
+            raise SearchTimeout()
+
+        player = game.current_player
+        moves = game.get_moves_mask(player)
+        if not moves:
+            if not game.get_moves_mask(3 - player):
+                return self.final_score(game, player)
+            record = game.make_pass()
+            score = -self.negamax(game, depth, -beta, -alpha)
+            game.unmake_move(record)
+            return score
+
+        if depth <= 0:
+            return self.evaluate(game, player)
+
+        key = game.hash
+        tt_move = NO_MOVE
+        entry = self.table.probe(key)
+        if entry:
+            tt_depth, bound, score, tt_move = entry
+            if tt_depth >= depth:
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score >= beta:
+                    return score
+                if bound == UPPER and score <= alpha:
+                    return score
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = NO_MOVE
+
+        for square in self.order_moves(game, moves, tt_move, depth):
+            record = game.make_move_square(square, player)
+            if game.current_player == player:
+                score = self.negamax(game, depth - 1, alpha, beta)
+            else:
+                score = -self.negamax(game, depth - 1, -beta, -alpha)
+            game.unmake_move(record)
+
+            if score > best_score:
+                best_score = score
+                best_move = square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, bound, best_score, best_move)
+        return best_score
+
+    def order_moves(self, game, moves, tt_move, depth):
+        """TT move first, then corners, then moves leaving the opponent fewest replies"""
+        player = game.current_player
+        scored = []
+        for square in iter_squares(moves):
+            if square == tt_move:
+                key = -3 * INFINITY
+            elif (1 << square) & CORNERS:
+                key = -2 * INFINITY
+            elif depth >= 2:
+                record = game.make_move_square(square, player)
+                key = popcount(game.get_moves_mask(3 - player)) * 100 - SQUARE_WEIGHTS[square]
+                game.unmake_move(record)
+            else:
+                key = -SQUARE_WEIGHTS[square]
+            scored.append((key, square))
+        scored.sort()
+        return [square for _, square in scored]
+
+    def evaluate(self, game, player):
+        own = game.bitboards[player]
+        opp = game.bitboards[3 - player]
+
+        score = 0
+        for weight, mask in WEIGHT_MASKS:
+            score += weight * (popcount(own & mask) - popcount(opp & mask))
+
+        own_moves = popcount(game.get_moves_mask(player))
+        opp_moves = popcount(game.get_moves_mask(3 - player))
+        return score + MOBILITY_WEIGHT * (own_moves - opp_moves)
+
+    def final_score(self, game, player):
+        return (popcount(game.bitboards[player]) - popcount(game.bitboards[3 - player])) * FINAL_SCALE
+
+def final_diff(own, opp):
+    return popcount(own) - popcount(opp)
+
+def odd_parity_regions(empties):
+    """Union of the quadrants holding an odd number of empty squares"""
+    regions = 0
+    for quadrant in QUADRANTS:
+        if popcount(empties & quadrant) & 1:
+            regions |= quadrant
+    return regions
+
+def solve_last1(own, opp, square):
+    move_bit = 1 << square
+    flips = get_flips(own, opp, move_bit)
+    if flips:
+        return final_diff(own | move_bit | flips, opp ^ flips)
+    flips = get_flips(opp, own, move_bit)
+    if flips:
+        return final_diff(own ^ flips, opp | move_bit | flips)
+    return final_diff(own, opp)
+
+def solve_last2(own, opp, alpha, beta, first, second, passed=False):
+    best = -INFINITY
+    for square, other in ((first, second), (second, first)):
+        move_bit = 1 << square
+        flips = get_flips(own, opp, move_bit)
+        if flips:
+            score = -solve_last1(opp ^ flips, own | move_bit | flips, other)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        return best
+
+    if best == -INFINITY:
+        if passed:
+            return final_diff(own, opp)
+        return -solve_last2(opp, own, -beta, -alpha, first, second, True)
+    return best
+
+def solve_last3(own, opp, alpha, beta, squares, passed=False):
+    best = -INFINITY
+    for index, square in enumerate(squares):
+        move_bit = 1 << square
+        flips = get_flips(own, opp, move_bit)
+        if flips:
+            first, second = squares[:index] + squares[index + 1:]
+            score = -solve_last2(opp ^ flips, own | move_bit | flips, -beta, -alpha, first, second)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        return best
+
+    if best == -INFINITY:
+        if passed:
+            return final_diff(own, opp)
+        return -solve_last3(opp, own, -beta, -alpha, squares, True)
+    return best
+
+def parity_order(squares):
+    """Play first into quadrants holding a single empty square of the three"""
+    first, second, third = squares
+    if QUADRANT_OF[first] == QUADRANT_OF[second]:
+        return third, first, second
+    if QUADRANT_OF[first] == QUADRANT_OF[third]:
+        return second, first, third
+    return squares
+
+class EndgameSolver:
+    """Exact disc-differential search for the last few empty squares"""
+
+    def __init__(self):
+        self.nodes = 0
+        self.deadline = 0
+
+    def solve_root(self, game, deadline):
+        """Return (square, disc differential) for the side to move, or raise SearchTimeout"""
+        self.deadline = deadline
+        self.nodes = 0
+        player = game.current_player
+        own = game.bitboards[player]
+        opp = game.bitboards[3 - player]
+        empties = ~(own | opp) & FULL_MASK
+
+        alpha = -INFINITY
+        best_move = NO_MOVE
+        for square, flips in self.order_moves(own, opp, get_moves(own, opp), empties):
+            move_bit = 1 << square
+            score = -self.solve(opp ^ flips, own | move_bit | flips, -INFINITY, -alpha, empties ^ move_bit)
+            if score > alpha:
+                alpha = score
+                best_move = square
+        return best_move, alpha
+
+    def solve(self, own, opp, alpha, beta, empties, passed=False):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.monotonic() >= self.deadline:
+            raise SearchTimeout()
+
+        empty_count = popcount(empties)
+        if empty_count == 0:
+            return final_diff(own, opp)
+        if empty_count == 1:
+            return solve_last1(own, opp, empties.bit_length() - 1)
+        if empty_count == 2:
+            first, second = iter_squares(empties)
+            return solve_last2(own, opp, alpha, beta, first, second)
+        if empty_count == 3:
+            return solve_last3(own, opp, alpha, beta, parity_order(tuple(iter_squares(empties))))
+
+        moves = get_moves(own, opp)
+        if not moves:
+            if passed:
+                return final_diff(own, opp)
+            return -self.solve(opp, own, -beta, -alpha, empties, True)
+
+        best = -INFINITY
+        for square, flips in self.order_moves(own, opp, moves, empties):
+            move_bit = 1 << square
+            score = -self.solve(opp ^ flips, own | move_bit | flips, -beta, -alpha, empties ^ move_bit)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def order_moves(self, own, opp, moves, empties):
+        ordered = []
+        if popcount(empties) > FASTEST_FIRST_EMPTIES:
+            for square in iter_squares(moves):
+                move_bit = 1 << square
+                flips = get_flips(own, opp, move_bit)
+                replies = popcount(get_moves(opp ^ flips, own | move_bit | flips))
+                if move_bit & CORNERS:
+                    replies -= 1
+                ordered.append((replies, square, flips))
+        else:
+            odd = odd_parity_regions(empties)
+            for square in iter_squares(moves):
+                move_bit = 1 << square
+                ordered.append((0 if move_bit & odd else 1, square, get_flips(own, opp, move_bit)))
+        ordered.sort()
+        return [(square, flips) for _, square, flips in ordered]
+
+class MCTSAI:
+    """UCT search whose leaves are scored by batches of vectorised random playouts.
+
+    The tree lives in flat NumPy arrays indexed by node id; the children of
+    a node are stored contiguously from first_child.
+    """
+
+    def __init__(self, player_color, time_budget=None, playouts=None, batch_size=256,
+                 exploration=1.4, name="🤖 AI", seed=None):
+        self.player_color = player_color
+        self.time_budget = time_budget
+        self.playouts = playouts if playouts or time_budget else 4096
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.name = name
+        self.rng = np.random.default_rng(seed)
+
+    def make_move(self, game_logic):
+        if not game_logic.get_moves_mask(self.player_color):
+            return None
+        square = self.search(game_logic.bitboards[1], game_logic.bitboards[2], self.player_color)
+        return square >> 3, square & 7
+
+    def search(self, black, white, player):
+        deadline = time.monotonic() + self.time_budget if self.time_budget else None
+        self.reset_tree()
+        root = self.add_node(-1, NO_MOVE, black, white, player, 3 - player)
+        self.expand(root)
+
+        played = 0
+        while True:
+            leaves = [self.select(root) for _ in range(self.batch_size)]
+            nodes = np.array(leaves, dtype=np.int64)
+            winners = batch_logic.random_playouts(self.positions[nodes], self.to_move[nodes], self.rng)
+            for leaf, winner in zip(leaves, winners):
+                self.backpropagate(leaf, winner)
+
+            played += len(leaves)
+            if self.playouts and played >= self.playouts:
+                break
+            if deadline and time.monotonic() >= deadline:
+                break
+
+        start = self.first_child[root]
+        children = slice(start, start + self.child_count[root])
+        best = start + int(np.argmax(self.visits[children]))
+        return int(self.move[best])
+
+    def reset_tree(self, capacity=4096):
+        self.size = 0
+        self.parent = np.empty(capacity, dtype=np.int32)
+        self.first_child = np.empty(capacity, dtype=np.int32)
+        self.child_count = np.empty(capacity, dtype=np.int8)
+        self.move = np.empty(capacity, dtype=np.uint8)
+        self.positions = np.empty((capacity, 2), dtype=np.uint64)
+        self.to_move = np.empty(capacity, dtype=np.int8)
+        self.mover = np.empty(capacity, dtype=np.int8)
+        self.visits = np.empty(capacity, dtype=np.float64)
+        self.wins = np.empty(capacity, dtype=np.float64)
+
+    def grow(self):
+        for name in ('parent', 'first_child', 'child_count', 'move', 'positions',
+                     'to_move', 'mover', 'visits', 'wins'):
+            array = getattr(self, name)
+            grown = np.empty((len(array) * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add_node(self, parent, move, black, white, to_move, mover):
+        if self.size == len(self.parent):
+            self.grow()
+        node = self.size
+        self.size += 1
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.child_count[node] = 0
+        self.move[node] = move
+        self.positions[node] = (black, white)
+        self.to_move[node] = to_move
+        self.mover[node] = mover
+        self.visits[node] = 0
+        self.wins[node] = 0
+        return node
+
+    def expand(self, node):
+        black, white = (int(bits) for bits in self.positions[node])
+        player = int(self.to_move[node])
+        bitboards = [0, black, white]
+        own, opp = bitboards[player], bitboards[3 - player]
+        moves = get_moves(own, opp)
+
+        self.first_child[node] = self.size
+        self.child_count[node] = popcount(moves)
+        for square in iter_squares(moves):
+            move_bit = 1 << square
+            flips = get_flips(own, opp, move_bit)
+            new_own = own | move_bit | flips
+            new_opp = opp ^ flips
+            next_player = 3 - player if get_moves(new_opp, new_own) else player
+            if player == 1:
+                self.add_node(node, square, new_own, new_opp, next_player, player)
+            else:
+                self.add_node(node, square, new_opp, new_own, next_player, player)
+
+    def select(self, node):
+        """Walk down by UCT to a leaf, adding a virtual loss on the way"""
+        while True:
+            self.visits[node] += 1
+            count = self.child_count[node]
+            if count == 0:
+                if self.first_child[node] != -1 or self.visits[node] == 1:
+                    return node
+                # Second visit to a leaf: grow it, unless the game is over there
+                self.expand(node)
+                count = self.child_count[node]
+                if count == 0:
+                    return node
+
+            start = self.first_child[node]
+            visits = self.visits[start:start + count]
+            unvisited = np.flatnonzero(visits == 0)
+            if len(unvisited):
+                node = start + int(unvisited[0])
+                continue
+
+            wins = self.wins[start:start + count]
+            uct = wins / visits + self.exploration * np.sqrt(math.log(self.visits[node]) / visits)
+            node = start + int(np.argmax(uct))
+
+    def backpropagate(self, node, winner):
+        while node != -1:
+            if winner == 0:
+                self.wins[node] += 0.5
+            elif winner == self.mover[node]:
+                self.wins[node] += 1
+            node = self.parent[node]
+
+def create_ai(level, player_color):
+    if AI_LEVELS.get(level) is None:
+        ai = BeginnerAI(player_color)
+    elif level in MCTS_LEVELS:
+        ai = MCTSAI(
+            player_color,
+            time_budget=AI_LEVELS[level],
+            name=f"🤖 AI ({AI_LEVEL_NAMES[level]})"
+        )
+    else:
+        ai = AlphaBetaAI(
+            player_color,
+            AI_LEVELS[level],
+            endgame_empties=ENDGAME_EMPTIES.get(level, 0),
+            name=f"🤖 AI ({AI_LEVEL_NAMES[level]})"
+        )
+    # Kept so the AI can be rebuilt from its level in a worker process
+    ai.level = level if level in AI_LEVELS else 'beginner'
+    return ai
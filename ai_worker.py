@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config import AI_WORKERS, AI_QUEUE_DEPTH
+from game_logic import OthelloGame
+from ai_player import create_ai
+from metrics import metrics
+
+def compute_move(black, white, player, level):
+    """Runs in a worker process: position in, (row, col) or None out"""
+    game = OthelloGame()
+    game.set_bitboards(black, white)
+    game.current_player = player
+    return create_ai(level, player).make_move(game)
+
+class AIWorkerPool:
+    def __init__(self, max_workers=AI_WORKERS, max_pending=AI_QUEUE_DEPTH):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.processes = None
+        self.closed = False
+        # Results are applied here so bot I/O never blocks the executor's
+        # result-collecting thread
+        self.results = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-results")
+
+    def submit(self, game_id, game_logic, level, callback):
+        """Queue an AI move for the side to move; returns False if the queue is full"""
+        with self.lock:
+            if self.closed:
+                return False
+            if len(self.jobs) >= self.max_pending or game_id in self.jobs:
+                metrics.counter("ai_rejected_total").inc()
+                return False
+            if self.processes is None:
+                self.processes = ProcessPoolExecutor(max_workers=self.max_workers)
+
+            future = self.processes.submit(
+                compute_move,
+                game_logic.bitboards[1],
+                game_logic.bitboards[2],
+                game_logic.current_player,
+                level
+            )
+            self.jobs[game_id] = future
+
+        histogram = metrics.histogram("ai_move_seconds", level=level)
+        started = time.perf_counter()
+        future.add_done_callback(lambda done: self._finish(game_id, done, callback, histogram, started))
+        return True
+
+    def cancel(self, game_id):
+        with self.lock:
+            future = self.jobs.pop(game_id, None)
+        if future:
+            future.cancel()
+
+    def pending(self):
+        return len(self.jobs)
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            futures = list(self.jobs.values())
+            self.jobs.clear()
+        # Cancelled by hand: shutdown(cancel_futures=True) needs Python 3.9
+        for future in futures:
+            future.cancel()
+        if self.processes:
+            self.processes.shutdown(wait=False)
+        self.results.shutdown(wait=False)
+
+    def _finish(self, game_id, future, callback, histogram, started):
+        with self.lock:
+            # A resign may have cancelled this job while it was running,
+            # and after shutdown no result is delivered
+            if self.closed or self.jobs.get(game_id) is not future:
+                return
+            del self.jobs[game_id]
+
+        if future.cancelled():
+            return
+        histogram.observe(time.perf_counter() - started)
+        try:
+            move = future.result()
+        except Exception as e:
+            metrics.record_error("ai_move", e)
+            move = None
+        with self.lock:
+            # shutdown() may have run since the check above
+            if not self.closed:
+                self.results.submit(callback, move)
+
+ai_pool = AIWorkerPool()
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from telebot.async_telebot import AsyncTeleBot
+from config import TOKEN, ASYNC_WORKERS
+from scheduler import scheduler
+from metrics import metrics, TimedBot
+import callbacks
+import bot as app
+
+async_bot = AsyncTeleBot(TOKEN)
+
+class BridgeBot:
+    """Sync facade over AsyncTeleBot for the handlers in bot.py.
+
+    Handlers run on executor threads; each API call is sent to the event
+    loop and waited on, so calls made by one handler keep their order.
+    """
+
+    def __init__(self, target, loop):
+        self.target = target
+        self.loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop).result()
+
+        return call
+
+class GameDispatcher:
+    """Per-key FIFO queues: work for one game runs strictly in order, different games concurrently"""
+
+    def __init__(self, loop, executor):
+        self.loop = loop
+        self.executor = executor
+        self.queues = {}
+
+    def submit(self, key, fn, *args):
+        """Queue `fn(*args)` behind earlier work for `key`; must be called on the loop"""
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            queue.append((fn, args))
+            self.loop.create_task(self._drain(key, queue))
+        else:
+            queue.append((fn, args))
+
+    def submit_threadsafe(self, key, fn, args):
+        self.loop.call_soon_threadsafe(self.submit, key, fn, *args)
+
+    def depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def _drain(self, key, queue):
+        while queue:
+            fn, args = queue[0]
+            try:
+                await self.loop.run_in_executor(self.executor, fn, *args)
+            except Exception as e:
+                metrics.record_error("dispatch", e)
+            queue.popleft()
+        del self.queues[key]
+
+dispatcher = None
+
+def callback_key(call, op, args):
+    # Game callbacks are ordered per game; everything else is ordered per user
+    if op in callbacks.GAME_OPS:
+        return ("game", args[0])
+    return ("user", call.from_user.id)
+
+def user_key(message):
+    return ("user", message.from_user.id)
+
+@async_bot.message_handler(commands=['start'])
+async def start_command(message):
+    dispatcher.submit(user_key(message), app.start_command, message)
+
+@async_bot.message_handler(commands=['newgame'])
+async def new_game_command(message):
+    dispatcher.submit(user_key(message), app.new_game_command, message)
+
+@async_bot.message_handler(commands=['status'])
+async def status_command(message):
+    dispatcher.submit(user_key(message), app.status_command, message)
+
+@async_bot.callback_query_handler(func=lambda call: True)
+async def handle_callback(call):
+    # Decoded once here; the worker gets the result along with the call
+    op, args = callbacks.decode(call.data)
+    dispatcher.submit(callback_key(call, op, args), app.dispatch_callback, call, op, args)
+
+async def main():
+    global dispatcher
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="game")
+    dispatcher = GameDispatcher(loop, executor)
+
+    # Handlers in bot.py now talk to Telegram through the event loop, and
+    # delayed AI moves join their game's queue instead of racing its clicks
+    app.bot = TimedBot(BridgeBot(async_bot, loop))
+    app.outbox.bot = app.bot
+    scheduler.dispatch = lambda key, fn, args: dispatcher.submit_threadsafe(("game", key), fn, args)
+
+    metrics.gauge("dispatch_depth", dispatcher.depth)
+
+    threading.Thread(target=app.restore_hot_state, name="restore", daemon=True).start()
+    metrics.start_exporters()
+    print("Bot started (asyncio)")
+    await async_bot.infinity_polling()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,176 @@
+import numpy as np
+
+# Vectorised counterpart of game_logic for many positions at once. Positions
+# are (N, 2) uint64 arrays of [black, white] bitboards using the same square
+# numbering as OthelloGame, or (N, 8, 8) int8 boards which are converted.
+# Sides to move are (N,) arrays of 1 (black) or 2 (white).
+
+FULL_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+NOT_COL_0 = np.uint64(0xFEFEFEFEFEFEFEFE)
+NOT_COL_7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+ZERO = np.uint64(0)
+ONE = np.uint64(1)
+
+SQUARE_BITS = ONE << np.arange(64, dtype=np.uint64)
+
+# (shift, left?, mask) for the eight directions, mirroring game_logic.SHIFTS
+DIRECTIONS = (
+    (np.uint64(9), False, NOT_COL_7),
+    (np.uint64(8), False, FULL_MASK),
+    (np.uint64(7), False, NOT_COL_0),
+    (np.uint64(1), False, NOT_COL_7),
+    (np.uint64(1), True, NOT_COL_0),
+    (np.uint64(7), True, NOT_COL_7),
+    (np.uint64(8), True, FULL_MASK),
+    (np.uint64(9), True, NOT_COL_0),
+)
+
+if hasattr(np, "bitwise_count"):
+    def popcount(bits):
+        return np.bitwise_count(bits).astype(np.int64)
+else:
+    _BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+    def popcount(bits):
+        bits = np.ascontiguousarray(bits, dtype=np.uint64)
+        return _BYTE_COUNTS[bits.view(np.uint8).reshape(bits.shape + (8,))].sum(axis=-1)
+
+def _shift(bits, amount, left, mask):
+    if left:
+        return (bits << amount) & mask
+    return (bits >> amount) & mask
+
+def boards_to_bitboards(boards):
+    flat = np.asarray(boards, dtype=np.int8).reshape(-1, 64)
+    bitboards = np.empty((len(flat), 2), dtype=np.uint64)
+    bitboards[:, 0] = np.where(flat == 1, SQUARE_BITS, ZERO).sum(axis=1, dtype=np.uint64)
+    bitboards[:, 1] = np.where(flat == 2, SQUARE_BITS, ZERO).sum(axis=1, dtype=np.uint64)
+    return bitboards
+
+def bitboards_to_boards(bitboards):
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    black = (bitboards[:, 0:1] & SQUARE_BITS) != 0
+    white = (bitboards[:, 1:2] & SQUARE_BITS) != 0
+    boards = black.astype(np.int8) + 2 * white.astype(np.int8)
+    return boards.reshape(-1, 8, 8)
+
+def as_bitboards(positions):
+    positions = np.asarray(positions)
+    if positions.ndim == 3:
+        return boards_to_bitboards(positions)
+    return positions.astype(np.uint64, copy=False)
+
+def split_sides(bitboards, players):
+    """(own, opp) bitboards for the side to move in each position"""
+    white_to_move = np.asarray(players) == 2
+    own = np.where(white_to_move, bitboards[:, 1], bitboards[:, 0])
+    opp = np.where(white_to_move, bitboards[:, 0], bitboards[:, 1])
+    return own, opp
+
+def get_moves(own, opp):
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for amount, left, mask in DIRECTIONS:
+        x = _shift(own, amount, left, mask) & opp
+        for _ in range(5):
+            x |= _shift(x, amount, left, mask) & opp
+        moves |= _shift(x, amount, left, mask) & empty
+    return moves
+
+def get_flips(own, opp, move_bits):
+    flips = np.zeros_like(own)
+    for amount, left, mask in DIRECTIONS:
+        line = _shift(move_bits, amount, left, mask) & opp
+        for _ in range(5):
+            line |= _shift(line, amount, left, mask) & opp
+        bounded = (_shift(line, amount, left, mask) & own) != 0
+        flips |= np.where(bounded, line, ZERO)
+    return flips
+
+def legal_moves(positions, players):
+    """Legal-move bitmask for the side to move in each position"""
+    bitboards = as_bitboards(positions)
+    return get_moves(*split_sides(bitboards, players))
+
+def unpack_moves(masks):
+    """(N, 8, 8) bool array of the squares set in each move mask"""
+    return ((np.asarray(masks, dtype=np.uint64)[:, None] & SQUARE_BITS) != 0).reshape(-1, 8, 8)
+
+def play_moves(positions, players, squares):
+    """Play one square per position and return (next bitboards, next players).
+
+    Squares are 0-63 in row * 8 + col order; -1, or an illegal square,
+    leaves that position unchanged. As in OthelloGame.make_move, the turn
+    stays with the mover when the opponent has no reply.
+    """
+    bitboards = as_bitboards(positions)
+    players = np.asarray(players)
+    squares = np.asarray(squares)
+    own, opp = split_sides(bitboards, players)
+
+    move_bits = np.where(squares >= 0, ONE << np.clip(squares, 0, 63).astype(np.uint64), ZERO)
+    flips = get_flips(own, opp, move_bits)
+    played = flips != 0
+
+    new_own = np.where(played, own | move_bits | flips, own)
+    new_opp = np.where(played, opp ^ flips, opp)
+
+    opp_can_move = get_moves(new_opp, new_own) != 0
+    switch = played & opp_can_move
+    next_players = np.where(switch, 3 - players, players).astype(players.dtype)
+
+    white_moved = players == 2
+    next_bitboards = np.empty_like(bitboards)
+    next_bitboards[:, 0] = np.where(white_moved, new_opp, new_own)
+    next_bitboards[:, 1] = np.where(white_moved, new_own, new_opp)
+    return next_bitboards, next_players
+
+def scores(positions):
+    """(N, 2) disc counts of [black, white]"""
+    return popcount(as_bitboards(positions))
+
+def game_over(positions):
+    bitboards = as_bitboards(positions)
+    black, white = bitboards[:, 0], bitboards[:, 1]
+    return (get_moves(black, white) == 0) & (get_moves(white, black) == 0)
+
+def random_squares(masks, rng):
+    """One uniformly random set square per mask, -1 where the mask is empty"""
+    bits = (np.asarray(masks, dtype=np.uint64)[:, None] & SQUARE_BITS) != 0
+    keys = np.where(bits, rng.random(bits.shape), -1.0)
+    squares = keys.argmax(axis=1)
+    return np.where(bits.any(axis=1), squares, -1)
+
+def random_playouts(positions, players, rng):
+    """Play every position to the end with uniformly random moves.
+
+    Returns the winner of each game: 1 black, 2 white, 0 draw.
+    """
+    bitboards = as_bitboards(positions).copy()
+    players = np.array(players, dtype=np.int8)
+    active = np.arange(len(bitboards))
+
+    while len(active):
+        current = bitboards[active]
+        to_move = players[active]
+        own, opp = split_sides(current, to_move)
+        masks = get_moves(own, opp)
+
+        # A side with no move hands the turn over; if neither can move the game is done
+        stuck = masks == 0
+        if stuck.any():
+            other_masks = get_moves(opp, own)
+            finished = stuck & (other_masks == 0)
+            to_move = np.where(stuck, 3 - to_move, to_move).astype(np.int8)
+            masks = np.where(stuck, other_masks, masks)
+            keep = ~finished
+            active, current, to_move, masks = active[keep], current[keep], to_move[keep], masks[keep]
+            if not len(active):
+                break
+
+        next_bitboards, next_players = play_moves(current, to_move, random_squares(masks, rng))
+        bitboards[active] = next_bitboards
+        players[active] = next_players
+
+    counts = scores(bitboards)
+    return np.where(counts[:, 0] > counts[:, 1], 1, np.where(counts[:, 1] > counts[:, 0], 2, 0))
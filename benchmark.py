@@ -0,0 +1,325 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from telebot import apihelper, types
+import callbacks
+
+# Load generator for bot.py. The real handlers run against FakeTelegramApi,
+# installed as telebot's request sender, while simulated players read the
+# boards it receives and press their move buttons like a Telegram client:
+#
+#   python benchmark.py --games 20 --ai-games 10 --think 0.5 --duration 60
+#
+# Click-to-edit latency is measured from a player's click until their board
+# message is next edited, so it includes the outbox pacing.
+
+VALID_MOVE_SYMBOL = "🔘"
+PLAYER_NAMES = {1: "Black", 2: "White"}
+# Answers the move handler gives when it accepted the click
+ACCEPTED_ANSWERS = ("Move made", "Game over")
+HUMAN_ID_BASE = 10000
+AI_OPPONENT_ID_BASE = 20000
+
+class FakeResponse:
+    def __init__(self, result):
+        self.status_code = 200
+        self.text = json.dumps({"ok": True, "result": result})
+
+    def json(self):
+        return json.loads(self.text)
+
+class FakeTelegramApi:
+    """Stand-in for the Bot API that keeps the last text and keyboard of every message"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.condition = threading.Condition()
+        self.calls = Counter()
+        self.message_ids = itertools.count(1)
+        self.messages = {}
+        # chat_id -> message_id of the newest board sent to that chat
+        self.boards = {}
+        # (chat_id, message_id) -> time of the click waiting for its edit
+        self.waiting = {}
+        self.answers = {}
+        self.latencies = []
+
+    def __call__(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        name = url.rsplit("/", 1)[1]
+        params = params or {}
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.condition:
+            self.calls[name] += 1
+            result = True
+            if name == "sendMessage":
+                result = self._send_message(params)
+            elif name == "editMessageText":
+                self._edit_message(params)
+            elif name == "getChat":
+                chat_id = int(params["chat_id"])
+                result = {"id": chat_id, "type": "private", "first_name": f"Player {chat_id}"}
+            elif name == "answerCallbackQuery":
+                self.answers[params["callback_query_id"]] = params.get("text")
+            self.condition.notify_all()
+        return FakeResponse(result)
+
+    def _send_message(self, params):
+        chat_id = int(params["chat_id"])
+        message_id = next(self.message_ids)
+        keyboard = self._keyboard(params)
+        self.messages[(chat_id, message_id)] = (params["text"], keyboard)
+        if keyboard:
+            self.boards[chat_id] = message_id
+        return {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": params["text"]
+        }
+
+    def _edit_message(self, params):
+        if "message_id" not in params:
+            return
+        key = (int(params["chat_id"]), int(params["message_id"]))
+        self.messages[key] = (params["text"], self._keyboard(params))
+        clicked = self.waiting.pop(key, None)
+        if clicked is not None:
+            self.latencies.append(time.perf_counter() - clicked)
+
+    def _keyboard(self, params):
+        markup = params.get("reply_markup")
+        if not markup:
+            return None
+        return json.loads(markup)["inline_keyboard"]
+
+    def view(self, chat_id):
+        """(message_id, text, keyboard) of the board shown in a chat, or None"""
+        message_id = self.boards.get(chat_id)
+        if message_id is None:
+            return None
+        text, keyboard = self.messages[(chat_id, message_id)]
+        return message_id, text, keyboard
+
+class TimedDatabase:
+    """Wraps the public methods of a Database instance to total their time"""
+
+    def __init__(self, db):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.seconds = defaultdict(float)
+        for name, attr in vars(type(db)).items():
+            if callable(attr) and not name.startswith("_") and name != "init_tables":
+                setattr(db, name, self._wrap(name, getattr(db, name)))
+
+    def _wrap(self, name, method):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.counts[name] += 1
+                    self.seconds[name] += elapsed
+
+        return timed
+
+class LoadTest:
+    def __init__(self, app, api, args):
+        self.app = app
+        self.api = api
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.query_ids = itertools.count(1)
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.handler_times = []
+        self.clicks = 0
+        self.rejected = 0
+        self.finished = 0
+        self.games = []
+        # Updates are handled on a fixed pool, as TeleBot does with num_threads
+        self.workers = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="handler")
+
+    def callback(self, user_id, data, message_id):
+        return types.CallbackQuery.de_json({
+            "id": str(next(self.query_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Player {user_id}"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"}, "text": ""
+            }
+        })
+
+    def setup(self):
+        for index in range(self.args.games):
+            black = HUMAN_ID_BASE + 2 * index
+            white = black + 1
+            invite_id = self.app.db.create_invite(black, white)
+            self.app.handle_callback(self.callback(white, callbacks.accept_data(invite_id), 0))
+            self.games.append([(black, 1), (white, 2)])
+
+        for index in range(self.args.ai_games):
+            user_id = AI_OPPONENT_ID_BASE + index
+            self.app.handle_callback(self.callback(user_id, callbacks.ai_level_data(self.args.ai_level), 0))
+            self.games.append([(user_id, 1)])
+
+    def next_click(self, players):
+        """Wait for a player whose turn it is; returns (user_id, message_id, data) or None once the game ends"""
+        with self.api.condition:
+            while not self.stop.is_set():
+                for user_id, color in players:
+                    view = self.api.view(user_id)
+                    if view is None:
+                        continue
+                    message_id, text, keyboard = view
+                    if keyboard is None:
+                        return None
+                    if (user_id, message_id) in self.api.waiting:
+                        continue
+                    if text.rsplit("Turn: ", 1)[-1] != PLAYER_NAMES[color]:
+                        continue
+                    moves = [button["callback_data"] for row in keyboard for button in row
+                             if button["text"] == VALID_MOVE_SYMBOL]
+                    if moves:
+                        return user_id, message_id, self.random.choice(moves)
+                self.api.condition.wait(0.5)
+        return None
+
+    def handle(self, call):
+        started = time.perf_counter()
+        self.app.handle_callback(call)
+        return time.perf_counter() - started
+
+    def play(self, players):
+        while True:
+            click = self.next_click(players)
+            if click is None:
+                break
+            user_id, message_id, data = click
+            time.sleep(self.args.think)
+            call = self.callback(user_id, data, message_id)
+
+            with self.api.condition:
+                self.api.waiting[(user_id, message_id)] = time.perf_counter()
+            elapsed = self.workers.submit(self.handle, call).result()
+
+            with self.api.condition:
+                answer = self.api.answers.pop(call.id, None)
+                if answer not in ACCEPTED_ANSWERS:
+                    self.api.waiting.pop((user_id, message_id), None)
+            with self.lock:
+                self.clicks += 1
+                self.handler_times.append(elapsed)
+                if answer not in ACCEPTED_ANSWERS:
+                    self.rejected += 1
+
+        if not self.stop.is_set():
+            with self.lock:
+                self.finished += 1
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self.play, args=(players,), name=f"player-{index}", daemon=True)
+            for index, players in enumerate(self.games)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        deadline = started + self.args.duration
+        for thread in threads:
+            thread.join(max(0, deadline - time.perf_counter()))
+        self.stop.set()
+        with self.api.condition:
+            self.api.condition.notify_all()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+def format_ms(values):
+    return "  ".join(
+        f"{label} {percentile(values, percent) * 1000:.1f}ms"
+        for label, percent in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+    )
+
+def report(test, api, timed_db, outbox, elapsed):
+    args = test.args
+    lines = [
+        f"games: {args.games} human vs human, {args.ai_games} vs AI ({args.ai_level}); "
+        f"{args.workers} workers, think {args.think}s, api latency {args.api_latency}ms",
+        f"elapsed: {elapsed:.1f}s, games finished: {test.finished}/{len(test.games)}",
+        f"clicks: {test.clicks} ({test.clicks / elapsed:.1f}/s), rejected: {test.rejected}, "
+        f"unanswered: {len(api.waiting)}",
+        f"click-to-edit: {format_ms(api.latencies)}",
+        f"handler time:  {format_ms(test.handler_times)}",
+        "",
+        f"database: {sum(timed_db.counts.values())} calls, {sum(timed_db.seconds.values()) * 1000:.1f}ms total",
+    ]
+    for name, count in timed_db.counts.most_common():
+        seconds = timed_db.seconds[name]
+        lines.append(f"  {name:<24}{count:>8} calls {seconds * 1000:>10.1f}ms {seconds / count * 1e6:>9.1f}us/call")
+
+    lines.append("")
+    lines.append(f"api: {sum(api.calls.values())} calls")
+    for name, count in api.calls.most_common():
+        lines.append(f"  {name:<24}{count:>8}")
+    lines.append(
+        f"outbox: sent {outbox.sent}, coalesced {outbox.coalesced}, "
+        f"retried {outbox.retried}, failed {outbox.failed}"
+    )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run bot.py against a fake Telegram API and report latency")
+    parser.add_argument("--games", type=int, default=10, help="human vs human games")
+    parser.add_argument("--ai-games", type=int, default=5, help="human vs AI games")
+    parser.add_argument("--ai-level", default="easy")
+    parser.add_argument("--workers", type=int, default=2, help="handler threads (TeleBot's default is 2)")
+    parser.add_argument("--think", type=float, default=0.5, help="seconds a player waits before clicking")
+    parser.add_argument("--duration", type=float, default=120, help="stop after this many seconds")
+    parser.add_argument("--api-latency", type=float, default=0, help="milliseconds added to every API call")
+    parser.add_argument("--ai-delay", type=float, default=0, help="AI_MOVE_DELAY for the run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # Configure before bot.py is imported: it reads config and opens the database at import
+    os.environ["BOT_TOKEN"] = "0:benchmark"
+    os.environ["AI_MOVE_DELAY"] = str(args.ai_delay)
+    os.environ.setdefault("OPENING_BOOK", os.path.abspath("opening_book.bin"))
+    output = os.path.abspath(args.output) if args.output else None
+    os.chdir(tempfile.mkdtemp(prefix="othello-bench-"))
+
+    api = FakeTelegramApi(args.api_latency / 1000)
+    apihelper.CUSTOM_REQUEST_SENDER = api
+    import bot as app
+
+    timed_db = TimedDatabase(app.db)
+    test = LoadTest(app, api, args)
+    test.setup()
+    elapsed = test.run()
+    app.ai_pool.shutdown()
+
+    text = report(test, api, timed_db, app.outbox, elapsed)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
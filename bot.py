@@ -1,17 +1,125 @@
 import telebot
-import json
+import hashlib
+import threading
 import time
-from config import TOKEN
+from config import TOKEN, AI_MOVE_DELAY
 from database import db
-from game_logic import OthelloGame
-from keyboards import invite_keyboard, game_board_keyboard, main_menu_keyboard, game_mode_keyboard
-from ai_player import BeginnerAI
+from game_cache import game_cache
+from stats import stats_manager
+from keyboards import invite_keyboard, game_board_markup, main_menu_keyboard, game_mode_keyboard, ai_level_keyboard
+from ai_player import create_ai, BeginnerAI, AI_LEVELS, AI_LEVEL_NAMES
+from ai_worker import ai_pool
+from scheduler import scheduler
+from outbox import outbox
+from metrics import metrics, TimedBot
+import callbacks
 
 
-bot = telebot.TeleBot(TOKEN)
+bot = TimedBot(telebot.TeleBot(TOKEN))
+outbox.bot = bot
     
 game_messages = {}
 ai_games = {}
+# game_id -> {(chat_id, message_id): digest of the last text and markup queued},
+# dropped again if that edit fails so the next render is sent
+message_digests = {}
+FINAL_DIGEST = "final"
+
+metrics.gauge("active_games", db.count_active_games)
+metrics.gauge("ai_games", lambda: len(ai_games))
+metrics.gauge("game_cache_size", lambda: len(game_cache))
+metrics.gauge("outbox_depth", outbox.depth)
+metrics.gauge("ai_queue_depth", ai_pool.pending)
+metrics.gauge("scheduler_depth", scheduler.pending)
+
+def render_digest(text, reply_markup):
+    markup = reply_markup.to_json() if reply_markup else ""
+    return hashlib.blake2b(f"{text}\0{markup}".encode(), digest_size=8).digest()
+
+# Set once restore_hot_state has loaded every active game after a restart
+hot_state_loaded = threading.Event()
+
+def load_hot_state(game_id=None):
+    messages, ai_seats = db.get_hot_state(game_id)
+    
+    for loaded_game_id, player_id, message_id in messages:
+        # setdefault: a handler may already have registered a newer message
+        game_messages.setdefault(loaded_game_id, {}).setdefault(player_id, message_id)
+    
+    restored = []
+    for loaded_game_id, player_color, level in ai_seats:
+        if loaded_game_id not in ai_games:
+            ai_games[loaded_game_id] = create_ai(level, player_color)
+            restored.append(loaded_game_id)
+    return restored
+
+def restore_hot_state():
+    """Reload board messages and AI seats of active games, then resume AI turns"""
+    try:
+        restored = load_hot_state()
+    finally:
+        hot_state_loaded.set()
+    
+    for game_id in restored:
+        resume_ai_game(game_id)
+    
+    print(f"Restored {len(game_messages)} games")
+
+def resume_ai_game(game_id):
+    """Restart the AI of a reloaded game if it is the AI's turn"""
+    entry = game_cache.get(game_id)
+    if not entry:
+        return
+    game, game_logic = entry
+    make_ai_move(game_id, game_logic, game)
+
+def ensure_hot_state(game_id):
+    """Load one game's state on demand while the full restore is still running"""
+    if not hot_state_loaded.is_set() and game_id not in game_messages:
+        # The full restore skips seats loaded here, so resume them now
+        for restored_game_id in load_hot_state(game_id):
+            resume_ai_game(restored_game_id)
+
+def show_final_board(game_id, text):
+    """Put the result on every board message of a game, then forget its messages"""
+    db.delete_game_messages(game_id)
+    for player_id, message_id in game_messages.pop(game_id, {}).items():
+        edit_game_message(
+            game_id,
+            text,
+            player_id,
+            message_id,
+            final=True
+        )
+    # Nothing edits the game again once it is gone from game_messages
+    message_digests.pop(game_id, None)
+
+def edit_game_message(game_id, text, chat_id, message_id, reply_markup=None, final=False):
+    """Queue an edit unless the message already shows it or already shows the final result"""
+    digests = message_digests.setdefault(game_id, {})
+    key = (chat_id, message_id)
+    previous = digests.get(key)
+    if previous == FINAL_DIGEST:
+        return
+    
+    digest = FINAL_DIGEST if final else render_digest(text, reply_markup)
+    if digest == previous:
+        return
+    
+    digests[key] = digest
+    outbox.edit_message_text(
+        text,
+        chat_id=chat_id,
+        message_id=message_id,
+        reply_markup=reply_markup,
+        on_fail=lambda: forget_digest(game_id, key, digest)
+    )
+
+def forget_digest(game_id, key, digest):
+    """Stop claiming a message shows `digest` after its edit failed"""
+    digests = message_digests.get(game_id)
+    if digests is not None and digests.get(key) == digest:
+        digests.pop(key, None)
 
 @bot.message_handler(commands=['start'])
 def start_command(message):
@@ -64,24 +172,20 @@ def new_game_command(message):
             reply_markup=invite_keyboard(invite_id)
         )
         bot.reply_to(message, f"Invite sent to @{username_input}")
-    except:
+    except Exception as e:
+        metrics.record_error("send_invite", e, quiet=True)
         bot.reply_to(message, "Cannot send invite")
 
 @bot.message_handler(commands=['status'])
 def status_command(message):
     user_id = message.from_user.id
-    game = db.get_user_active_game(user_id)
+    entry = game_cache.get_for_user(user_id)
     
-    if not game:
+    if not entry:
         bot.reply_to(message, "No active game")
         return
     
-    game_logic = OthelloGame(
-        json.loads(game['board_state']),
-        game['current_player']
-    )
-    
-    moves = game_logic.get_valid_moves(game_logic.current_player)
+    game, game_logic = entry
     
     black_score, white_score = game_logic.get_scores()
     
@@ -93,64 +197,62 @@ def status_command(message):
     bot.send_message(
         message.chat.id,
         text,
-        reply_markup=game_board_keyboard(game['id'], moves, game_logic.board)
+        reply_markup=game_board_markup(game['id'], game_logic)
     )
 
 @bot.callback_query_handler(func=lambda call: True)
 def handle_callback(call):
+    op, args = callbacks.decode(call.data)
+    dispatch_callback(call, op, args)
+
+def dispatch_callback(call, op, args):
+    """Run the handler for an already decoded callback"""
     try:
-        data = call.data
-        
-        if data == "new_game":
-            bot.edit_message_text(
-                "Choose game mode:",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=game_mode_keyboard()
-            )
-        
-        elif data == "main_menu":
-            text = "Othello Bot\n\nCommands:\n/newgame - Start new game\n/status - Current game"
-            bot.edit_message_text(
-                text,
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=main_menu_keyboard()
-            )
-        
-        elif data == "play_friend":
-            bot.edit_message_text(
-                "To play with a friend:\nUse /newgame @username",
-                call.message.chat.id,
-                call.message.message_id
-            )
-        
-        elif data == "play_ai":
-            start_ai_game(call)
-        
-        elif data == "scores":
-            handle_scores(call)
-        
-        elif data.startswith("accept:"):
-            handle_accept(call)
-        
-        elif data.startswith("reject:"):
-            handle_reject(call)
-        
-        elif data.startswith("move:"):
-            handle_move(call)
-        
-        elif data.startswith("status:"):
-            handle_status(call)
-        
-        elif data.startswith("resign:"):
-            handle_resign(call)
+        handler = CALLBACK_HANDLERS.get(op)
+        if handler:
+            with metrics.timer("callback_seconds", handler=handler.__name__):
+                handler(call, *args)
     
     except Exception as e:
-        print(f"Error: {e}")
+        metrics.record_error("callback", e)
         bot.answer_callback_query(call.id, "Error")
 
-def start_ai_game(call):
+def show_game_modes(call):
+    bot.edit_message_text(
+        "Choose game mode:",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=game_mode_keyboard()
+    )
+
+def show_main_menu(call):
+    text = "Othello Bot\n\nCommands:\n/newgame - Start new game\n/status - Current game"
+    bot.edit_message_text(
+        text,
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=main_menu_keyboard()
+    )
+
+def show_friend_help(call):
+    bot.edit_message_text(
+        "To play with a friend:\nUse /newgame @username",
+        call.message.chat.id,
+        call.message.message_id
+    )
+
+def show_ai_levels(call):
+    bot.edit_message_text(
+        "Choose AI level:",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=ai_level_keyboard(AI_LEVEL_NAMES)
+    )
+
+def start_ai_game(call, level="beginner"):
+    if level not in AI_LEVELS:
+        level = "beginner"
+    
     user_id = call.from_user.id
     user_name = call.from_user.first_name
     
@@ -159,7 +261,7 @@ def start_ai_game(call):
         bot.answer_callback_query(call.id, "You have active game")
         return
     
-    ai_player = BeginnerAI(2)
+    ai_player = create_ai(level, 2)
     
     game_id = db.create_game(
         user_id,
@@ -168,15 +270,11 @@ def start_ai_game(call):
         ai_player.name
     )
     
-    game = db.get_game(game_id)
-    game_logic = OthelloGame(
-        json.loads(game['board_state']),
-        game['current_player']
-    )
+    game, game_logic = game_cache.get(game_id)
     
     ai_games[game_id] = ai_player
+    db.save_ai_game(game_id, ai_player.player_color, ai_player.level)
     
-    moves = game_logic.get_valid_moves(game_logic.current_player)
     black_score, white_score = game_logic.get_scores()
     
     text = f"Game #{game_id}\n\n"
@@ -184,22 +282,23 @@ def start_ai_game(call):
     text += f"⚪ {ai_player.name}: {white_score}\n\n"
     text += f"Turn: {game_logic.player_names[game_logic.current_player]}"
     
-    keyboard = game_board_keyboard(game_id, moves, game_logic.board)
+    keyboard = game_board_markup(game_id, game_logic)
     
     try:
-        message = bot.send_message(
+        message = outbox.send_message(
             user_id,
             text,
             reply_markup=keyboard
         )
         game_messages[game_id] = {user_id: message.message_id}
-    except:
-        pass
+        db.save_game_message(game_id, user_id, message.message_id)
+        message_digests[game_id] = {(user_id, message.message_id): render_digest(text, keyboard)}
+    except Exception as e:
+        metrics.record_error("send_board", e, quiet=True)
     
     bot.answer_callback_query(call.id, "AI game started")
     
     if game_logic.current_player == 2:
-        time.sleep(1)
         make_ai_move(game_id, game_logic, game)
 
 def handle_scores(call):
@@ -214,7 +313,8 @@ def handle_scores(call):
             chat_id=call.message.chat.id,
             message_id=call.message.message_id
         )
-    except:
+    except Exception as e:
+        metrics.record_error("edit_scores", e, quiet=True)
         bot.send_message(
             call.message.chat.id,
             stats_message
@@ -222,10 +322,7 @@ def handle_scores(call):
     
     bot.answer_callback_query(call.id, "Statistics loaded")
 
-def handle_accept(call):
-    _, invite_id = call.data.split(":")
-    invite_id = int(invite_id)
-    
+def handle_accept(call, invite_id):
     invite = db.get_invite(invite_id)
     if not invite:
         bot.answer_callback_query(call.id, "No invite")
@@ -242,13 +339,8 @@ def handle_accept(call):
         player2_name
     )
     
-    game = db.get_game(game_id)
-    game_logic = OthelloGame(
-        json.loads(game['board_state']),
-        game['current_player']
-    )
+    game, game_logic = game_cache.get(game_id)
     
-    moves = game_logic.get_valid_moves(game_logic.current_player)
     black_score, white_score = game_logic.get_scores()
     
     text = f"Game #{game_id}\n\n"
@@ -256,7 +348,7 @@ def handle_accept(call):
     text += f"⚪ {player2_name}: {white_score}\n\n"
     text += f"Turn: {game_logic.player_names[game_logic.current_player]}"
     
-    keyboard = game_board_keyboard(game_id, moves, game_logic.board)
+    keyboard = game_board_markup(game_id, game_logic)
     
     bot.edit_message_text(
         "Game started",
@@ -268,21 +360,20 @@ def handle_accept(call):
     
     for player_id in [player1_id, player2_id]:
         try:
-            message = bot.send_message(
+            message = outbox.send_message(
                 player_id,
                 text,
                 reply_markup=keyboard
             )
             game_messages[game_id][player_id] = message.message_id
-        except:
-            pass
+            db.save_game_message(game_id, player_id, message.message_id)
+            message_digests.setdefault(game_id, {})[(player_id, message.message_id)] = render_digest(text, keyboard)
+        except Exception as e:
+            metrics.record_error("send_board", e, quiet=True)
     
     bot.answer_callback_query(call.id, "Started")
 
-def handle_reject(call):
-    _, invite_id = call.data.split(":")
-    invite_id = int(invite_id)
-    
+def handle_reject(call, invite_id):
     invite = db.get_invite(invite_id)
     if not invite:
         bot.answer_callback_query(call.id, "No invite")
@@ -298,34 +389,33 @@ def handle_reject(call):
     
     bot.answer_callback_query(call.id)
 
-def handle_move(call):
-    _, game_id, row, col = call.data.split(":")
-    game_id = int(game_id)
-    row = int(row)
-    col = int(col)
+def handle_move(call, game_id, square):
+    row, col = divmod(square, 8)
     
-    game = db.get_game(game_id)
-    if not game:
+    entry = game_cache.get(game_id)
+    if not entry:
         bot.answer_callback_query(call.id, "No game")
         return
     
-    game_logic = OthelloGame(
-        json.loads(game['board_state']),
-        game['current_player']
-    )
+    ensure_hot_state(game_id)
+    
+    game, game_logic = entry
     
     current_player = game['player1'] if game_logic.current_player == 1 else game['player2']
     if call.from_user.id != current_player:
         bot.answer_callback_query(call.id, "Not your turn")
         return
     
+    base_hash = game_logic.hash
     if not game_logic.make_move(row, col, game_logic.current_player):
         bot.answer_callback_query(call.id, "Invalid move")
         return
     
-    db.update_game_board(game_id, game_logic.board, game_logic.current_player)
+    # Another click on this game was saved first; this one played on a stale board
+    if not game_cache.save(game_id, game_logic, base_hash):
+        bot.answer_callback_query(call.id, "Invalid move")
+        return
     
-    moves = game_logic.get_valid_moves(game_logic.current_player)
     black_score, white_score = game_logic.get_scores()
     
     text = f"Game #{game_id}\n\n"
@@ -333,58 +423,47 @@ def handle_move(call):
     text += f"⚪ {game['player2_name']}: {white_score}\n\n"
     text += f"Turn: {game_logic.player_names[game_logic.current_player]}"
     
-    keyboard = game_board_keyboard(game_id, moves, game_logic.board)
+    keyboard = game_board_markup(game_id, game_logic)
     
     if game_id in game_messages:
         for player_id, message_id in game_messages[game_id].items():
-            try:
-                bot.edit_message_text(
-                    text,
-                    chat_id=player_id,
-                    message_id=message_id,
-                    reply_markup=keyboard
-                )
-            except:
-                pass
+            edit_game_message(
+                game_id,
+                text,
+                player_id,
+                message_id,
+                reply_markup=keyboard
+            )
     
     if game_logic.is_game_over():
         winner = game_logic.get_winner()
         if winner == 0:
             result = "Draw"
-            db.end_game(game_id, "draw")
+            game_cache.end(game_id, "draw")
         else:
             winner_name = game['player1_name'] if winner == 1 else game['player2_name']
             result = f"Winner: {winner_name}"
             if winner == 1:
-                db.end_game(game_id, "player1")
+                game_cache.end(game_id, "player1")
             else:
-                db.end_game(game_id, "player2")
+                game_cache.end(game_id, "player2")
         
         final_text = f"Game Over\n\n"
         final_text += f"⚫ {game['player1_name']}: {black_score}\n"
         final_text += f"⚪ {game['player2_name']}: {white_score}\n\n"
         final_text += result
         
-        if game_id in game_messages:
-            for player_id, message_id in game_messages[game_id].items():
-                try:
-                    bot.edit_message_text(
-                        final_text,
-                        chat_id=player_id,
-                        message_id=message_id
-                    )
-                except:
-                    pass
+        show_final_board(game_id, final_text)
         
         if game_id in ai_games:
             del ai_games[game_id]
+            db.delete_ai_game(game_id)
         
         bot.answer_callback_query(call.id, "Game over")
     else:
         bot.answer_callback_query(call.id, "Move made")
         
         if game_id in ai_games:
-            time.sleep(1)
             make_ai_move(game_id, game_logic, game)
 
 def make_ai_move(game_id, game_logic, game):
@@ -396,18 +475,39 @@ def make_ai_move(game_id, game_logic, game):
     if game_logic.current_player != ai_player.player_color:
         return
     
-    ai_move = ai_player.make_move(game_logic)
+    # The search runs during the delay; the move is shown once both are over
+    due = time.monotonic() + AI_MOVE_DELAY
+    
+    def schedule_apply(ai_move):
+        scheduler.schedule_at(due, apply_ai_move, game_id, game_logic, game, ai_move, key=game_id)
+    
+    if not ai_pool.submit(game_id, game_logic, ai_player.level, schedule_apply):
+        # Queue is full: answer with a cheap move instead of stalling the game
+        schedule_apply(BeginnerAI(ai_player.player_color).make_move(game_logic))
+
+def apply_ai_move(game_id, game_logic, game, ai_move):
+    if game_id not in ai_games:
+        return
+    
+    ai_player = ai_games[game_id]
+    
+    if game_logic.current_player != ai_player.player_color:
+        return
+    
+    if not ai_move or not game_logic.is_valid_move(ai_move[0], ai_move[1], ai_player.player_color):
+        ai_move = BeginnerAI(ai_player.player_color).make_move(game_logic)
     
     if not ai_move:
         return
     
     row, col = ai_move
     
+    base_hash = game_logic.hash
     game_logic.make_move(row, col, ai_player.player_color)
     
-    db.update_game_board(game_id, game_logic.board, game_logic.current_player)
+    if not game_cache.save(game_id, game_logic, base_hash):
+        return
     
-    moves = game_logic.get_valid_moves(game_logic.current_player)
     black_score, white_score = game_logic.get_scores()
     
     text = f"Game #{game_id}\n\n"
@@ -415,71 +515,55 @@ def make_ai_move(game_id, game_logic, game):
     text += f"⚪ {ai_player.name}: {white_score}\n\n"
     text += f"Turn: {game_logic.player_names[game_logic.current_player]}"
     
-    keyboard = game_board_keyboard(game_id, moves, game_logic.board)
+    keyboard = game_board_markup(game_id, game_logic)
     
     if game_id in game_messages:
         for player_id, message_id in game_messages[game_id].items():
-            try:
-                bot.edit_message_text(
-                    text,
-                    chat_id=player_id,
-                    message_id=message_id,
-                    reply_markup=keyboard
-                )
-            except:
-                pass
+            edit_game_message(
+                game_id,
+                text,
+                player_id,
+                message_id,
+                reply_markup=keyboard
+            )
     
     if game_logic.is_game_over():
         winner = game_logic.get_winner()
         if winner == 0:
             result = "Draw"
-            db.end_game(game_id, "draw")
+            game_cache.end(game_id, "draw")
         else:
             winner_name = game['player1_name'] if winner == 1 else ai_player.name
             result = f"Winner: {winner_name}"
             if winner == 1:
-                db.end_game(game_id, "player1")
+                game_cache.end(game_id, "player1")
             else:
-                db.end_game(game_id, "player2")
+                game_cache.end(game_id, "player2")
         
         final_text = f"Game Over\n\n"
         final_text += f"⚫ {game['player1_name']}: {black_score}\n"
         final_text += f"⚪ {ai_player.name}: {white_score}\n\n"
         final_text += result
         
-        if game_id in game_messages:
-            for player_id, message_id in game_messages[game_id].items():
-                try:
-                    bot.edit_message_text(
-                        final_text,
-                        chat_id=player_id,
-                        message_id=message_id
-                    )
-                except:
-                    pass
+        show_final_board(game_id, final_text)
         
         if game_id in ai_games:
             del ai_games[game_id]
+            db.delete_ai_game(game_id)
     else:
         if game_id in ai_games and game_logic.current_player == ai_player.player_color:
-            time.sleep(1)
             make_ai_move(game_id, game_logic, game)
 
-def handle_status(call):
-    _, game_id = call.data.split(":")
-    game_id = int(game_id)
-    
-    game = db.get_game(game_id)
-    if not game:
+def handle_status(call, game_id):
+    entry = game_cache.get(game_id)
+    if not entry:
         bot.answer_callback_query(call.id, "No game")
         return
     
-    game_logic = OthelloGame(
-        json.loads(game['board_state']),
-        game['current_player']
-    )
+    ensure_hot_state(game_id)
+    
+    game, game_logic = entry
     
-    moves = game_logic.get_valid_moves(game_logic.current_player)
     black_score, white_score = game_logic.get_scores()
     
     text = f"Game #{game_id}\n\n"
@@ -487,30 +571,27 @@ def handle_status(call):
     text += f"⚪ {game['player2_name']}: {white_score}\n\n"
     text += f"Turn: {game_logic.player_names[game_logic.current_player]}"
     
-    keyboard = game_board_keyboard(game_id, moves, game_logic.board)
+    keyboard = game_board_markup(game_id, game_logic)
     
     if game_id in game_messages and call.from_user.id in game_messages[game_id]:
-        try:
-            bot.edit_message_text(
-                text,
-                chat_id=call.from_user.id,
-                message_id=game_messages[game_id][call.from_user.id],
-                reply_markup=keyboard
-            )
-        except:
-            pass
+        edit_game_message(
+            game_id,
+            text,
+            call.from_user.id,
+            game_messages[game_id][call.from_user.id],
+            reply_markup=keyboard
+        )
     
     bot.answer_callback_query(call.id, "Updated")
 
-def handle_resign(call):
-    _, game_id = call.data.split(":")
-    game_id = int(game_id)
-    
+def handle_resign(call, game_id):
     game = db.get_game(game_id)
     if not game:
         bot.answer_callback_query(call.id, "No game")
         return
     
+    ensure_hot_state(game_id)
+    
     user_id = call.from_user.id
     
     if user_id == game['player1']:
@@ -522,28 +603,38 @@ def handle_resign(call):
         winner_name = game['player1_name']
         loser_name = game['player2_name']
     
-    db.end_game(game_id, winner)
+    game_cache.end(game_id, winner)
     
     text = f"Game #{game_id}\n\n"
     text += f"{loser_name} resigned\n"
     text += f"🏆 Winner: {winner_name}"
     
-    if game_id in game_messages:
-        for player_id, message_id in game_messages[game_id].items():
-            try:
-                bot.edit_message_text(
-                    text,
-                    chat_id=player_id,
-                    message_id=message_id
-                )
-            except:
-                pass
+    show_final_board(game_id, text)
     
     if game_id in ai_games:
         del ai_games[game_id]
+        db.delete_ai_game(game_id)
+        ai_pool.cancel(game_id)
+        scheduler.cancel(game_id)
     
     bot.answer_callback_query(call.id, "Resigned")
 
+CALLBACK_HANDLERS = {
+    callbacks.NEW_GAME: show_game_modes,
+    callbacks.MAIN_MENU: show_main_menu,
+    callbacks.PLAY_FRIEND: show_friend_help,
+    callbacks.PLAY_AI: show_ai_levels,
+    callbacks.AI_LEVEL: start_ai_game,
+    callbacks.SCORES: handle_scores,
+    callbacks.ACCEPT: handle_accept,
+    callbacks.REJECT: handle_reject,
+    callbacks.MOVE: handle_move,
+    callbacks.STATUS: handle_status,
+    callbacks.RESIGN: handle_resign,
+}
+
 if __name__ == "__main__":
+    threading.Thread(target=restore_hot_state, name="restore", daemon=True).start()
+    metrics.start_exporters()
     print("Bot started")
     bot.infinity_polling()
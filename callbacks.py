@@ -0,0 +1,151 @@
+# Compact callback_data codec. A payload is one opcode character followed by
+# its arguments in a base-64 alphabet: a move is "m" + square + game id, so
+# even a 10-digit game id fits in a few bytes of Telegram's 64-byte limit.
+# The older "move:{game_id}:{row}:{col}" style payloads still decode, so
+# boards sent before the switch keep working. Ids are encoded so that no
+# compact payload ever spells one of the legacy names.
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_"
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+
+MOVE = "m"
+STATUS = "s"
+RESIGN = "r"
+ACCEPT = "a"
+REJECT = "x"
+AI_LEVEL = "l"
+NEW_GAME = "n"
+MAIN_MENU = "h"
+PLAY_FRIEND = "f"
+PLAY_AI = "p"
+SCORES = "c"
+
+# Callbacks whose first argument is a game id
+GAME_OPS = (MOVE, STATUS, RESIGN)
+
+LEGACY_NAMES = {
+    "new_game": NEW_GAME,
+    "main_menu": MAIN_MENU,
+    "play_friend": PLAY_FRIEND,
+    "play_ai": PLAY_AI,
+    "scores": SCORES,
+    "move": MOVE,
+    "status": STATUS,
+    "resign": RESIGN,
+    "accept": ACCEPT,
+    "reject": REJECT,
+    "ai_level": AI_LEVEL,
+}
+# Legacy payloads that carried no arguments, and so no ":"
+LEGACY_COMMANDS = ("new_game", "main_menu", "play_friend", "play_ai", "scores")
+# What could follow the opcode (and a move's square) in a payload spelling a legacy name
+LEGACY_TAILS = {name[1:] for name in LEGACY_NAMES} | {name[2:] for name in LEGACY_NAMES}
+
+def encode_int(value):
+    if value == 0:
+        return ALPHABET[0]
+    chars = []
+    while value:
+        value, digit = divmod(value, 64)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+def encode_id(value):
+    """encode_int for an id inside a payload, with a leading zero where the
+    payload could otherwise spell a legacy name"""
+    text = encode_int(value)
+    if text in LEGACY_TAILS:
+        return ALPHABET[0] + text
+    return text
+
+def decode_int(text):
+    value = 0
+    for char in text:
+        value = value * 64 + DIGITS[char]
+    return value
+
+def move_data(game_id, square):
+    return MOVE + ALPHABET[square] + encode_id(game_id)
+
+def status_data(game_id):
+    return STATUS + encode_id(game_id)
+
+def resign_data(game_id):
+    return RESIGN + encode_id(game_id)
+
+def accept_data(invite_id):
+    return ACCEPT + encode_id(invite_id)
+
+def reject_data(invite_id):
+    return REJECT + encode_id(invite_id)
+
+def ai_level_data(level):
+    return AI_LEVEL + level
+
+def _decode_move(rest):
+    return decode_int(rest[1:]), DIGITS[rest[0]]
+
+def _decode_id(rest):
+    return (decode_int(rest),)
+
+def _decode_level(rest):
+    return (rest,)
+
+def _decode_none(rest):
+    return ()
+
+DECODERS = {
+    MOVE: _decode_move,
+    STATUS: _decode_id,
+    RESIGN: _decode_id,
+    ACCEPT: _decode_id,
+    REJECT: _decode_id,
+    AI_LEVEL: _decode_level,
+    NEW_GAME: _decode_none,
+    MAIN_MENU: _decode_none,
+    PLAY_FRIEND: _decode_none,
+    PLAY_AI: _decode_none,
+    SCORES: _decode_none,
+}
+
+def _decode_legacy(data):
+    name, *fields = data.split(":")
+    op = LEGACY_NAMES.get(name)
+    if op == MOVE:
+        game_id, row, col = fields
+        return op, (int(game_id), int(row) * 8 + int(col))
+    if op == AI_LEVEL:
+        return op, tuple(fields)
+    if op in (STATUS, RESIGN, ACCEPT, REJECT):
+        return op, (int(fields[0]),)
+    return op, ()
+
+def decode(data):
+    """(opcode, args) for a callback payload, or (None, ()) if it is not ours.
+
+    Moves decode to (game_id, square), game and invite callbacks to their
+    id, and AI level picks to the level name.
+    """
+    try:
+        if ":" in data or data in LEGACY_COMMANDS:
+            return _decode_legacy(data)
+        decoder = DECODERS.get(data[:1])
+        if decoder is None:
+            return None, ()
+        return data[0], decoder(data[1:])
+    except (KeyError, ValueError, IndexError):
+        return None, ()
+
+if __name__ == "__main__":
+    # Round-trip check: python callbacks.py
+    game_ids = list(range(5000)) + [decode_int(tail) for tail in LEGACY_TAILS if tail and all(c in DIGITS for c in tail)]
+    for game_id in game_ids:
+        for data, expected in [(status_data(game_id), (STATUS, (game_id,))),
+                               (resign_data(game_id), (RESIGN, (game_id,))),
+                               (accept_data(game_id), (ACCEPT, (game_id,))),
+                               (reject_data(game_id), (REJECT, (game_id,)))]:
+            assert data not in LEGACY_NAMES and decode(data) == expected, (data, expected)
+        for square in range(64):
+            data = move_data(game_id, square)
+            assert data not in LEGACY_NAMES and decode(data) == (MOVE, (game_id, square)), (data, game_id, square)
+    print(f"ok: {len(game_ids)} ids x 64 squares")
@@ -3,4 +3,60 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-TOKEN = os.getenv("BOT_TOKEN")
\ No newline at end of file
+TOKEN = os.getenv("BOT_TOKEN")
+
+# Upper bound on the memory used by the AI transposition table, shared by all games
+TT_SIZE_MB = int(os.getenv("TT_SIZE_MB", "16"))
+
+# Binary opening book consulted by the AI before searching; see opening_book.py
+OPENING_BOOK = os.getenv("OPENING_BOOK", "opening_book.bin")
+
+# Processes computing AI moves off the bot's threads, and how many AI moves
+# may be queued or running before new ones fall back to the Beginner AI
+AI_WORKERS = int(os.getenv("AI_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+AI_QUEUE_DEPTH = int(os.getenv("AI_QUEUE_DEPTH", "64"))
+
+# Pause before the AI's reply is shown, so its move does not land instantly
+AI_MOVE_DELAY = float(os.getenv("AI_MOVE_DELAY", "1.0"))
+
+# Threads running game, database and AI code for the asyncio runtime (async_bot.py)
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", "32"))
+
+# Outbound Bot API pacing: Telegram allows about 30 messages/s overall and
+# roughly one per second per chat, with short bursts
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = float(os.getenv("OUTBOX_CHAT_BURST", "3"))
+
+# Finished board keyboards kept as JSON, keyed by game and position
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", "4096"))
+
+# Webhook mode (webhook.py): public base URL Telegram posts to, local bind
+# address, shared secret, and the worker queue that applies backpressure
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "32"))
+
+# Seconds a connection waits for another thread's write lock, and the page
+# cache each per-thread SQLite connection may use
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+DB_CACHE_MB = int(os.getenv("DB_CACHE_MB", "8"))
+
+# Group commit: writes are queued and committed together by one writer
+# thread, at most DB_BATCH_SIZE per transaction and waiting up to
+# DB_FLUSH_INTERVAL seconds for more. DB_WRITE_BEHIND=0 commits each write
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1") == "1"
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "0.005"))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "256"))
+
+# Active games kept in memory as live positions; least recently used drop out
+GAME_CACHE_SIZE = int(os.getenv("GAME_CACHE_SIZE", "10000"))
+
+# Prometheus text endpoint (/metrics) port and seconds between metrics log
+# lines; 0 turns either off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "60"))
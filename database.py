@@ -1,14 +1,199 @@
 import sqlite3
-import json
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+from config import DB_BUSY_TIMEOUT, DB_CACHE_MB, DB_WRITE_BEHIND, DB_FLUSH_INTERVAL, DB_BATCH_SIZE
+from metrics import metrics
+from game_logic import OthelloGame, board_to_bitboards, encode_bitboards, decode_board_state
+
+def add_winner_column(cur):
+    # Databases from before migrations may already have it
+    cur.execute("PRAGMA table_info(games)")
+    columns = [col[1] for col in cur.fetchall()]
+    if 'winner' not in columns:
+        cur.execute("ALTER TABLE games ADD COLUMN winner TEXT")
+
+def add_lookup_indexes(cur):
+    # The games indexes also carry the columns read by StatsManager, so its
+    # per-player queries are answered from the index alone
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_games_player1_status
+    ON games (player1, status, player2, player2_name, winner)
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_games_player2_status
+    ON games (player2, status, player1, player1_name, winner)
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_moves_game_id ON moves (game_id)")
+
+def encode_board_states(cur):
+    # Rewrite JSON boards as 16-byte blobs, a chunk at a time to bound memory
+    last_id = 0
+    while True:
+        cur.execute(
+            "SELECT id, board_state FROM games WHERE id > ? AND typeof(board_state)='text' ORDER BY id LIMIT 10000",
+            (last_id,)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            break
+        cur.executemany(
+            "UPDATE games SET board_state=? WHERE id=?",
+            [(encode_bitboards(*decode_board_state(board_state)), game_id) for game_id, board_state in rows]
+        )
+        last_id = rows[-1][0]
+
+def add_active_games_index(cur):
+    # Partial, so counting or listing active games reads only the active rows
+    # however many finished games the table holds
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_games_active ON games (id) WHERE status='active'")
+
+def prune_game_messages(cur):
+    # Board messages of games that ended before their rows were deleted on game end
+    cur.execute("DELETE FROM game_messages WHERE game_id IN (SELECT id FROM games WHERE status != 'active')")
+
+# Schema changes in order; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    add_winner_column,
+    add_lookup_indexes,
+    encode_board_states,
+    add_active_games_index,
+    prune_game_messages,
+]
 
 class Database:
-    def __init__(self, db_path="games.db"):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.cur = self.conn.cursor()
+    """SQLite access with one connection per thread.
+
+    Connections run in WAL mode so readers are not blocked by a writer,
+    and each call uses its own cursor instead of sharing one across threads.
+
+    With write_behind, writes are queued and a single writer thread commits
+    them in batches, one transaction per batch. Writes that return an id or
+    must be durable wait for their batch; reads of a game or invite first
+    wait for that row's queued writes, so callers always see their own.
+    """
+
+    def __init__(self, db_path="games.db", write_behind=DB_WRITE_BEHIND):
+        self.db_path = db_path
+        self.local = threading.local()
         self.init_tables()
+        
+        self.write_behind = write_behind
+        self.writes = queue.Queue()
+        self.pending_lock = threading.Lock()
+        # key -> Future of the latest queued write touching that row
+        self.pending = {}
+        self.last_write = None
+        if write_behind:
+            threading.Thread(target=self._run_writer, name="db-writer", daemon=True).start()
+            atexit.register(self.flush)
+    
+    @property
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only risks the last commits on power loss, never corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_MB * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def _write(self, sql, params, key=None, durable=False):
+        """Run or queue one write; returns a Future of its lastrowid"""
+        future = Future()
+        if not self.write_behind:
+            cur = self.conn.execute(sql, params)
+            self.conn.commit()
+            future.set_result(cur.lastrowid)
+            return future
+        
+        with self.pending_lock:
+            self.writes.put((sql, params, key, durable, future))
+            self.last_write = future
+            if key is not None:
+                self.pending[key] = future
+        if durable:
+            future.result()
+        return future
+    
+    def _wait_for(self, key=None):
+        """Block until queued writes for `key` (or all of them) are committed"""
+        with self.pending_lock:
+            future = self.last_write if key is None else self.pending.get(key)
+        if future is not None:
+            wait([future])
+    
+    def flush(self):
+        """Wait until every write queued so far is committed"""
+        self._wait_for()
+    
+    def _run_writer(self):
+        conn = self._connect()
+        while True:
+            batch = [self.writes.get()]
+            deadline = time.monotonic() + DB_FLUSH_INTERVAL
+            # Once a caller is waiting on a durable write, commit what we have now
+            durable = batch[0][3]
+            while len(batch) < DB_BATCH_SIZE and not durable:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.writes.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                durable = item[3]
+            while len(batch) < DB_BATCH_SIZE:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit_batch(conn, batch)
+    
+    def _commit_batch(self, conn, batch):
+        with metrics.timer("db_commit_seconds"):
+            try:
+                with conn:
+                    results = [conn.execute(sql, params).lastrowid for sql, params, _, _, _ in batch]
+            except sqlite3.Error:
+                # Find the bad statement by committing one at a time so the rest still land
+                results = []
+                for sql, params, _, _, future in batch:
+                    try:
+                        with conn:
+                            results.append(conn.execute(sql, params).lastrowid)
+                    except sqlite3.Error as e:
+                        metrics.record_error("db_write", e)
+                        results.append(e)
+        
+        metrics.counter("db_writes_total").inc(len(batch))
+        metrics.counter("db_commits_total").inc()
+        with self.pending_lock:
+            for (_, _, key, _, future), result in zip(batch, results):
+                if key is not None and self.pending.get(key) is future:
+                    del self.pending[key]
+                if self.last_write is future:
+                    self.last_write = None
+        for (_, _, _, _, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
     
     def init_tables(self):
-        self.cur.execute("""
+        cur = self.conn.cursor()
+        cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             username TEXT,
@@ -17,7 +202,7 @@ class Database:
         )
         """)
         
-        self.cur.execute("""
+        cur.execute("""
         CREATE TABLE IF NOT EXISTS invites (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             from_user INTEGER,
@@ -26,7 +211,7 @@ class Database:
         )
         """)
         
-        self.cur.execute("""
+        cur.execute("""
         CREATE TABLE IF NOT EXISTS games (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             player1 INTEGER,
@@ -39,7 +224,7 @@ class Database:
         )
         """)
         
-        self.cur.execute("""
+        cur.execute("""
         CREATE TABLE IF NOT EXISTS moves (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             game_id INTEGER,
@@ -49,24 +234,52 @@ class Database:
         )
         """)
         
-        self.cur.execute("PRAGMA table_info(games)")
-        columns = [col[1] for col in self.cur.fetchall()]
-        if 'winner' not in columns:
-            self.cur.execute("ALTER TABLE games ADD COLUMN winner TEXT")
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS game_messages (
+            game_id INTEGER,
+            player_id INTEGER,
+            message_id INTEGER,
+            PRIMARY KEY (game_id, player_id)
+        ) WITHOUT ROWID
+        """)
+        
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS ai_games (
+            game_id INTEGER PRIMARY KEY,
+            player_color INTEGER,
+            level TEXT
+        )
+        """)
         
         self.conn.commit()
+        self.migrate()
+    
+    def migrate(self):
+        """Apply the MIGRATIONS this database has not seen yet, each in its own transaction"""
+        conn = self.conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                migration(cur)
+                cur.execute(f"PRAGMA user_version={number}")
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
             
     def register_user(self, user_id, username, first_name):
-        self.cur.execute(
+        self._write(
             """INSERT OR REPLACE INTO users (user_id, username, first_name) 
             VALUES (?, ?, ?)""",
             (user_id, username, first_name)
         )
-        self.conn.commit()
     
     def get_user_by_username(self, username):
-        self.cur.execute("SELECT * FROM users WHERE username=?", (username.lower(),))
-        row = self.cur.fetchone()
+        self.flush()
+        cur = self.conn.execute("SELECT * FROM users WHERE username=?", (username.lower(),))
+        row = cur.fetchone()
         if row:
             return {
                 'user_id': row[0],
@@ -76,16 +289,16 @@ class Database:
         return None
     
     def create_invite(self, from_user, to_user):
-        self.cur.execute(
+        return self._write(
             "INSERT INTO invites (from_user, to_user, status) VALUES (?, ?, 'pending')",
-            (from_user, to_user)
-        )
-        self.conn.commit()
-        return self.cur.lastrowid
+            (from_user, to_user),
+            durable=True
+        ).result()
     
     def get_invite(self, invite_id):
-        self.cur.execute("SELECT * FROM invites WHERE id=?", (invite_id,))
-        row = self.cur.fetchone()
+        self._wait_for(("invite", invite_id))
+        cur = self.conn.execute("SELECT * FROM invites WHERE id=?", (invite_id,))
+        row = cur.fetchone()
         if row:
             return {
                 'id': row[0],
@@ -96,21 +309,20 @@ class Database:
         return None
     
     def update_invite(self, invite_id, status):
-        self.cur.execute("UPDATE invites SET status=? WHERE id=?", (status, invite_id))
-        self.conn.commit()
+        self._write("UPDATE invites SET status=? WHERE id=?", (status, invite_id), key=("invite", invite_id))
     
     def create_game(self, player1, player2, player1_name, player2_name):
-        self.cur.execute(
-            """INSERT INTO games (player1, player2, player1_name, player2_name) 
-            VALUES (?, ?, ?, ?)""",
-            (player1, player2, player1_name, player2_name)
-        )
-        self.conn.commit()
-        return self.cur.lastrowid
+        return self._write(
+            """INSERT INTO games (player1, player2, player1_name, player2_name, board_state) 
+            VALUES (?, ?, ?, ?, ?)""",
+            (player1, player2, player1_name, player2_name, OthelloGame().encode()),
+            durable=True
+        ).result()
     
     def get_game(self, game_id):
-        self.cur.execute("SELECT * FROM games WHERE id=?", (game_id,))
-        row = self.cur.fetchone()
+        self._wait_for(("game", game_id))
+        cur = self.conn.execute("SELECT * FROM games WHERE id=?", (game_id,))
+        row = cur.fetchone()
         if row:
             return {
                 'id': row[0],
@@ -125,11 +337,14 @@ class Database:
         return None
     
     def update_game_board(self, game_id, board_state, current_player):
-        self.cur.execute(
+        """board_state is OthelloGame.encode() bytes; an 8x8 list is still accepted"""
+        if not isinstance(board_state, bytes):
+            board_state = encode_bitboards(*board_to_bitboards(board_state))
+        self._write(
             "UPDATE games SET board_state=?, current_player=? WHERE id=?",
-            (json.dumps(board_state), current_player, game_id)
+            (board_state, current_player, game_id),
+            key=("game", game_id)
         )
-        self.conn.commit()
     
     def end_game(self, game_id, winner):
         winner_text = winner
@@ -142,25 +357,30 @@ class Database:
             elif winner == 2:
                 winner_text = "player2"
         
-        self.cur.execute(
+        # Results must survive a crash, so wait for the commit
+        self._write(
             "UPDATE games SET status='ended', winner=? WHERE id=?",
-            (winner_text, game_id)
+            (winner_text, game_id),
+            key=("game", game_id),
+            durable=True
         )
-        self.conn.commit()
     
     def add_move(self, game_id, player_id, move):
-        self.cur.execute(
+        self._write(
             "INSERT INTO moves (game_id, player_id, move) VALUES (?, ?, ?)",
             (game_id, player_id, move)
         )
-        self.conn.commit()
     
     def get_user_active_game(self, user_id):
-        self.cur.execute(
-            "SELECT * FROM games WHERE (player1=? OR player2=?) AND status='active'",
+        # Two index lookups instead of the table scan an OR forces
+        cur = self.conn.execute(
+            """SELECT * FROM games WHERE player1=? AND status='active'
+            UNION ALL
+            SELECT * FROM games WHERE player2=? AND status='active'
+            LIMIT 1""",
             (user_id, user_id)
         )
-        row = self.cur.fetchone()
+        row = cur.fetchone()
         if row:
             return {
                 'id': row[0],
@@ -174,4 +394,50 @@ class Database:
             }
         return None
 
+    def save_game_message(self, game_id, player_id, message_id):
+        self._write(
+            "INSERT OR REPLACE INTO game_messages (game_id, player_id, message_id) VALUES (?, ?, ?)",
+            (game_id, player_id, message_id)
+        )
+    
+    def save_ai_game(self, game_id, player_color, level):
+        self._write(
+            "INSERT OR REPLACE INTO ai_games (game_id, player_color, level) VALUES (?, ?, ?)",
+            (game_id, player_color, level)
+        )
+    
+    def delete_ai_game(self, game_id):
+        self._write("DELETE FROM ai_games WHERE game_id=?", (game_id,))
+    
+    def delete_game_messages(self, game_id):
+        self._write("DELETE FROM game_messages WHERE game_id=?", (game_id,))
+    
+    def get_hot_state(self, game_id=None):
+        """Board messages and AI seats of active games, for one game or all of them"""
+        self.flush()
+        game_filter = "AND g.id=?" if game_id is not None else ""
+        params = (game_id,) if game_id is not None else ()
+        
+        cur = self.conn.execute(
+            f"""SELECT m.game_id, m.player_id, m.message_id FROM game_messages m
+            JOIN games g ON g.id = m.game_id WHERE g.status='active' {game_filter}""",
+            params
+        )
+        messages = cur.fetchall()
+        
+        cur = self.conn.execute(
+            f"""SELECT a.game_id, a.player_color, a.level FROM ai_games a
+            JOIN games g ON g.id = a.game_id WHERE g.status='active' {game_filter}""",
+            params
+        )
+        ai_games = cur.fetchall()
+        
+        return messages, ai_games
+    
+    def count_active_games(self):
+        cur = self.conn.execute("SELECT COUNT(*) FROM games WHERE status='active'")
+        return cur.fetchone()[0]
+
+metrics.instrument(Database, "db_seconds", "method")
+
 db = Database()
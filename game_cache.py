@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from config import GAME_CACHE_SIZE
+from database import db
+from game_logic import OthelloGame
+from metrics import metrics
+
+class GameCache:
+    """LRU of active games as (game row, OthelloGame), written through to the database.
+
+    Callers get their own copy of the cached game to play on and hand it
+    back with save(), so two clicks on one game never mutate a shared
+    object. Ended games are dropped and served from the database.
+    """
+
+    def __init__(self, database=db, size=GAME_CACHE_SIZE):
+        self.db = database
+        self.size = size
+        self.entries = OrderedDict()
+        # user_id -> game_id of their cached active game, for /status
+        self.players = {}
+        self.lock = threading.Lock()
+        self.hits = metrics.counter("game_cache_hits_total")
+        self.misses = metrics.counter("game_cache_misses_total")
+
+    def get(self, game_id):
+        """(game, game_logic) or None; game_logic is the caller's own copy"""
+        with self.lock:
+            entry = self.entries.get(game_id)
+            if entry is not None:
+                self.entries.move_to_end(game_id)
+        if entry is not None:
+            self.hits.inc()
+            return entry[0], entry[1].copy()
+        self.misses.inc()
+        return self._load(self.db.get_game(game_id))
+
+    def get_for_user(self, user_id):
+        """The user's active game as (game, game_logic), or None"""
+        with self.lock:
+            entry = self.entries.get(self.players.get(user_id))
+            if entry is not None:
+                self.entries.move_to_end(entry[0]['id'])
+        if entry is not None:
+            self.hits.inc()
+            return entry[0], entry[1].copy()
+        self.misses.inc()
+        return self._load(self.db.get_user_active_game(user_id))
+
+    def save(self, game_id, game_logic, base_hash):
+        """Write a position reached from the one hashed as base_hash and cache it.
+
+        Returns False, writing nothing, if the cached game has moved on from
+        base_hash since the caller read it.
+        """
+        board_state = game_logic.encode()
+        # Held across the write so the database and the cache agree on the order of saves
+        with self.lock:
+            entry = self.entries.get(game_id)
+            if entry is not None and entry[1].hash != base_hash:
+                return False
+            self.db.update_game_board(game_id, board_state, game_logic.current_player)
+            if entry is not None:
+                game = dict(entry[0], board_state=board_state, current_player=game_logic.current_player)
+                self.entries[game_id] = (game, game_logic.copy())
+        return True
+
+    def end(self, game_id, winner):
+        self.db.end_game(game_id, winner)
+        with self.lock:
+            self._evict(game_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self, game):
+        if not game:
+            return None
+        game_logic = OthelloGame.from_state(game['board_state'], game['current_player'])
+        if game['status'] != 'active':
+            return game, game_logic
+
+        with self.lock:
+            entry = self.entries.get(game['id'])
+            if entry is not None:
+                # Another thread loaded it first and may have saved moves since
+                return entry[0], entry[1].copy()
+            self.entries[game['id']] = (game, game_logic.copy())
+            self.players[game['player1']] = game['id']
+            self.players[game['player2']] = game['id']
+            while len(self.entries) > self.size:
+                self._evict(next(iter(self.entries)))
+        return game, game_logic
+
+    def _evict(self, game_id):
+        entry = self.entries.pop(game_id, None)
+        if entry is None:
+            return
+        game = entry[0]
+        for player_id in (game['player1'], game['player2']):
+            if self.players.get(player_id) == game_id:
+                del self.players[player_id]
+
+game_cache = GameCache()
@@ -1,12 +1,185 @@
 import json
+import random
+import struct
+
+# Squares are numbered row * 8 + col, so bit 0 is the top-left corner and
+# bit 63 the bottom-right one. A position is two 64-bit integers, one per colour.
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+NOT_COL_0 = 0xFEFEFEFEFEFEFEFE
+NOT_COL_7 = 0x7F7F7F7F7F7F7F7F
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(bits):
+        return bin(bits).count("1")
+
+def shift_n(bits):
+    return bits >> 8
+
+def shift_s(bits):
+    return (bits << 8) & FULL_MASK
+
+def shift_e(bits):
+    return (bits << 1) & NOT_COL_0
+
+def shift_w(bits):
+    return (bits >> 1) & NOT_COL_7
+
+def shift_ne(bits):
+    return (bits >> 7) & NOT_COL_0
+
+def shift_nw(bits):
+    return (bits >> 9) & NOT_COL_7
+
+def shift_se(bits):
+    return (bits << 9) & NOT_COL_0
+
+def shift_sw(bits):
+    return (bits << 7) & NOT_COL_7
+
+SHIFTS = (shift_nw, shift_n, shift_ne, shift_w, shift_e, shift_sw, shift_s, shift_se)
+
+def get_moves(own, opp):
+    """Bitmask of the squares where the side owning `own` can play"""
+    empty = ~(own | opp) & FULL_MASK
+    moves = 0
+    for shift in SHIFTS:
+        x = shift(own) & opp
+        x |= shift(x) & opp
+        x |= shift(x) & opp
+        x |= shift(x) & opp
+        x |= shift(x) & opp
+        x |= shift(x) & opp
+        moves |= shift(x) & empty
+    return moves
+
+def get_flips(own, opp, move_bit):
+    """Bitmask of the discs flipped by playing `move_bit`, 0 if it is illegal"""
+    flips = 0
+    for shift in SHIFTS:
+        line = 0
+        x = shift(move_bit)
+        while x & opp:
+            line |= x
+            x = shift(x)
+        if x & own:
+            flips |= line
+    return flips
+
+# Square recorded for a null move in make_pass / unmake_move records
+PASS = -1
+
+# Zobrist keys are drawn from a fixed seed so hashes agree across processes
+# and restarts (the opening book and any persisted tables depend on that)
+_zobrist_rng = random.Random(0x0DD0)
+ZOBRIST = [
+    [0] * 64,
+    [_zobrist_rng.getrandbits(64) for _ in range(64)],
+    [_zobrist_rng.getrandbits(64) for _ in range(64)],
+]
+# Flipping a disc swaps its colour, which is the same XOR either way round
+ZOBRIST_FLIP = [ZOBRIST[1][square] ^ ZOBRIST[2][square] for square in range(64)]
+ZOBRIST_SIDE = [0, 0, _zobrist_rng.getrandbits(64)]
+
+def iter_squares(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+def zobrist_hash(black, white):
+    disc_hash = 0
+    for square in iter_squares(black):
+        disc_hash ^= ZOBRIST[1][square]
+    for square in iter_squares(white):
+        disc_hash ^= ZOBRIST[2][square]
+    return disc_hash
+
+def board_to_bitboards(board):
+    black = white = 0
+    for row in range(8):
+        for col in range(8):
+            cell = board[row][col]
+            if cell == 1:
+                black |= 1 << (row * 8 + col)
+            elif cell == 2:
+                white |= 1 << (row * 8 + col)
+    return black, white
+
+def bitboards_to_board(black, white):
+    board = [[0] * 8 for _ in range(8)]
+    for square in iter_squares(black):
+        board[square >> 3][square & 7] = 1
+    for square in iter_squares(white):
+        board[square >> 3][square & 7] = 2
+    return board
+
+# Stored board: black then white bitboard, little-endian, 16 bytes
+BOARD_STRUCT = struct.Struct("<QQ")
+
+def encode_bitboards(black, white):
+    return BOARD_STRUCT.pack(black, white)
+
+def decode_board_state(board_state):
+    """(black, white) from a stored board, either the 16-byte form or the older JSON text"""
+    if isinstance(board_state, (bytes, memoryview)):
+        return BOARD_STRUCT.unpack(board_state)
+    return board_to_bitboards(json.loads(board_state))
 
 class OthelloGame:
     def __init__(self, board_state=None, current_player=1):
+        # bitboards[player] holds that player's discs, index 0 is unused
+        self.bitboards = [0, 0, 0]
+        # Legal-move masks per player for the current position, None until computed
+        self._moves = [None, None, None]
+        # Zobrist hash of the discs only; the side to move is mixed in by `hash`
+        self.disc_hash = 0
         self.board = board_state or self.get_initial_board()
         self.current_player = current_player
         self.player_symbols = {1: '⚫', 2: '⚪'}
         self.player_names = {1: 'Black', 2: 'White'}
-    
+
+    @classmethod
+    def from_state(cls, board_state, current_player):
+        """Game from a stored board_state column, in either format"""
+        game = cls.__new__(cls)
+        game.set_bitboards(*decode_board_state(board_state))
+        game.current_player = current_player
+        game.player_symbols = {1: '⚫', 2: '⚪'}
+        game.player_names = {1: 'Black', 2: 'White'}
+        return game
+
+    def encode(self):
+        return encode_bitboards(self.bitboards[1], self.bitboards[2])
+
+    @property
+    def board(self):
+        return bitboards_to_board(self.bitboards[1], self.bitboards[2])
+
+    @board.setter
+    def board(self, board_state):
+        self.set_bitboards(*board_to_bitboards(board_state))
+
+    @property
+    def hash(self):
+        return self.disc_hash ^ ZOBRIST_SIDE[self.current_player]
+
+    def set_bitboards(self, black, white):
+        self.bitboards = [0, black, white]
+        self._moves = [None, None, None]
+        self.disc_hash = zobrist_hash(black, white)
+
+    def copy(self):
+        game = OthelloGame.__new__(OthelloGame)
+        game.bitboards = list(self.bitboards)
+        game._moves = list(self._moves)
+        game.disc_hash = self.disc_hash
+        game.current_player = self.current_player
+        game.player_symbols = self.player_symbols
+        game.player_names = self.player_names
+        return game
+
     def get_initial_board(self):
         board = [[0 for _ in range(8)] for _ in range(8)]
         board[3][3] = 1
@@ -14,100 +187,84 @@ class OthelloGame:
         board[4][3] = 2
         board[4][4] = 1
         return board
-    
+
+    def get_moves_mask(self, player):
+        moves = self._moves[player]
+        if moves is None:
+            moves = get_moves(self.bitboards[player], self.bitboards[3 - player])
+            self._moves[player] = moves
+        return moves
+
     def is_valid_move(self, row, col, player):
         if not (0 <= row < 8 and 0 <= col < 8):
             return False
-        
-        if self.board[row][col] != 0:
-            return False
-        
-        opponent = 3 - player
-        directions = [(-1,-1), (-1,0), (-1,1),
-                     (0,-1),         (0,1),
-                     (1,-1),  (1,0),  (1,1)]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            if not (0 <= r < 8 and 0 <= c < 8):
-                continue
-            
-            if self.board[r][c] != opponent:
-                continue
-            
-            r += dr
-            c += dc
-            
-            while 0 <= r < 8 and 0 <= c < 8:
-                if self.board[r][c] == 0:
-                    break
-                if self.board[r][c] == player:
-                    return True
-                r += dr
-                c += dc
-        
-        return False
-    
+        return bool(self.get_moves_mask(player) >> (row * 8 + col) & 1)
+
     def get_valid_moves(self, player):
-        moves = []
-        for row in range(8):
-            for col in range(8):
-                if self.is_valid_move(row, col, player):
-                    moves.append((row, col))
-        return moves
-    
+        return [(square >> 3, square & 7) for square in iter_squares(self.get_moves_mask(player))]
+
     def make_move(self, row, col, player):
-        if not self.is_valid_move(row, col, player):
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return False
+        return self.make_move_square(row * 8 + col, player)
+
+    def make_move_square(self, square, player):
+        """Play `square` for `player`, returning an undo record or False if illegal.
+
+        The record is a tuple (square, flips, player, previous_player,
+        previous_moves, previous_hash) that unmake_move uses to restore the
+        position.
+        """
+        move_bit = 1 << square
+        previous_moves = self._moves
+        if not self.get_moves_mask(player) & move_bit:
             return False
-        
-        self.board[row][col] = player
-        opponent = 3 - player
-        
-        directions = [(-1,-1), (-1,0), (-1,1),
-                     (0,-1),         (0,1),
-                     (1,-1),  (1,0),  (1,1)]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            if not (0 <= r < 8 and 0 <= c < 8):
-                continue
-            
-            if self.board[r][c] != opponent:
-                continue
-            
-            to_flip = []
-            to_flip.append((r, c))
-            r += dr
-            c += dc
-            
-            while 0 <= r < 8 and 0 <= c < 8:
-                if self.board[r][c] == 0:
-                    break
-                if self.board[r][c] == player:
-                    for fr, fc in to_flip:
-                        self.board[fr][fc] = player
-                    break
-                to_flip.append((r, c))
-                r += dr
-                c += dc
-        
+
+        own = self.bitboards[player]
+        opp = self.bitboards[3 - player]
+        flips = get_flips(own, opp, move_bit)
+        disc_hash = self.disc_hash
+        record = (square, flips, player, self.current_player, previous_moves, disc_hash)
+
+        self.bitboards[player] = own | move_bit | flips
+        self.bitboards[3 - player] = opp ^ flips
+        self._moves = [None, None, None]
+
+        disc_hash ^= ZOBRIST[player][square]
+        for flipped in iter_squares(flips):
+            disc_hash ^= ZOBRIST_FLIP[flipped]
+        self.disc_hash = disc_hash
         self.current_player = 3 - player
-        
-        if not self.get_valid_moves(self.current_player):
+
+        if not self.get_moves_mask(self.current_player):
             self.current_player = 3 - self.current_player
-        
-        return True
-    
+
+        return record
+
+    def make_pass(self):
+        """Hand the turn to the opponent without placing a disc"""
+        record = (PASS, 0, self.current_player, self.current_player, self._moves, self.disc_hash)
+        self.current_player = 3 - self.current_player
+        return record
+
+    def unmake_move(self, record):
+        square, flips, player, previous_player, previous_moves, previous_hash = record
+        if square != PASS:
+            self.bitboards[player] ^= (1 << square) | flips
+            self.bitboards[3 - player] |= flips
+        self._moves = previous_moves
+        self.disc_hash = previous_hash
+        self.current_player = previous_player
+
     def get_scores(self):
-        black = sum(row.count(1) for row in self.board)
-        white = sum(row.count(2) for row in self.board)
-        return black, white
-    
+        return popcount(self.bitboards[1]), popcount(self.bitboards[2])
+
+    def get_empty_count(self):
+        return 64 - popcount(self.bitboards[1] | self.bitboards[2])
+
     def is_game_over(self):
-        black_moves = self.get_valid_moves(1)
-        white_moves = self.get_valid_moves(2)
-        return not black_moves and not white_moves
-    
+        return not self.get_moves_mask(1) and not self.get_moves_mask(2)
+
     def get_winner(self):
         black, white = self.get_scores()
         if black > white:
@@ -1,59 +1,125 @@
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, JsonSerializable
+from config import KEYBOARD_CACHE_SIZE
+import callbacks
+
+BOARD_SYMBOLS = {0: '⬜', 1: '⚫', 2: '⚪'}
+VALID_MOVE_SYMBOL = "🔘"
+# Stands in for the game id inside pre-serialised rows
+GAME_ID_TOKEN = "#GAME#"
 
 def invite_keyboard(invite_id):
     keyboard = InlineKeyboardMarkup()
     keyboard.add(
-        InlineKeyboardButton("✅ Accept", callback_data=f"accept:{invite_id}"),
-        InlineKeyboardButton("❌ Reject", callback_data=f"reject:{invite_id}")
+        InlineKeyboardButton("✅ Accept", callback_data=callbacks.accept_data(invite_id)),
+        InlineKeyboardButton("❌ Reject", callback_data=callbacks.reject_data(invite_id))
     )
     return keyboard
 
-def game_board_keyboard(game_id, valid_moves, board_state=None):
-    keyboard = InlineKeyboardMarkup(row_width=8)
-    
-    symbols = {0: '⬜', 1: '⚫', 2: '⚪'}
-    
-    for row in range(8):
-        button_row = []
-        for col in range(8):
-            if board_state:
-                cell = board_state[row][col]
-                if cell == 0 and (row, col) in valid_moves:
-                    button_text = "🔘"
-                else:
-                    button_text = symbols.get(cell, '⬜')
-            else:
-                button_text = '⬜'
-                if (row, col) in valid_moves:
-                    button_text = "🔘"
-            
-            button_row.append(
-                InlineKeyboardButton(button_text, callback_data=f"move:{game_id}:{row}:{col}")
-            )
-        keyboard.add(*button_row)
-    
-    keyboard.add(
-        InlineKeyboardButton("🔄 Status", callback_data=f"status:{game_id}"),
-        InlineKeyboardButton("🏳️ Resign", callback_data=f"resign:{game_id}")
-    )
-    
-    return keyboard
+class CachedMarkup(JsonSerializable):
+    """A reply_markup whose JSON was built ahead of time"""
+
+    def __init__(self, json_text):
+        self.json_text = json_text
+
+    def to_json(self):
+        return self.json_text
+
+@lru_cache(maxsize=8192)
+def board_row_json(row, black_row, white_row, moves_row):
+    """JSON for one board row from its 8-bit slices of the bitboards and move mask"""
+    buttons = []
+    for col in range(8):
+        bit = 1 << col
+        if moves_row & bit:
+            text = VALID_MOVE_SYMBOL
+        elif black_row & bit:
+            text = BOARD_SYMBOLS[1]
+        elif white_row & bit:
+            text = BOARD_SYMBOLS[2]
+        else:
+            text = BOARD_SYMBOLS[0]
+        buttons.append({'text': text, 'callback_data': callbacks.MOVE + callbacks.ALPHABET[row * 8 + col] + GAME_ID_TOKEN})
+    return json.dumps(buttons)
+
+class BoardMarkupCache:
+    def __init__(self, size=KEYBOARD_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            markup = self.entries.get(key)
+            if markup is not None:
+                self.entries.move_to_end(key)
+            return markup
+
+    def put(self, key, markup):
+        with self.lock:
+            self.entries[key] = markup
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+board_markup_cache = BoardMarkupCache()
+
+def game_board_markup(game_id, game_logic):
+    """Board keyboard for the side to move, served from the cache when the position repeats"""
+    key = (game_id, game_logic.hash)
+    markup = board_markup_cache.get(key)
+    if markup is not None:
+        return markup
+
+    black = game_logic.bitboards[1]
+    white = game_logic.bitboards[2]
+    moves = game_logic.get_moves_mask(game_logic.current_player)
+    game_token = callbacks.encode_id(game_id)
+
+    rows = [
+        board_row_json(row, black >> (row * 8) & 0xFF, white >> (row * 8) & 0xFF, moves >> (row * 8) & 0xFF)
+        .replace(GAME_ID_TOKEN, game_token)
+        for row in range(8)
+    ]
+    footer = json.dumps([
+        {'text': "🔄 Status", 'callback_data': callbacks.status_data(game_id)},
+        {'text': "🏳️ Resign", 'callback_data': callbacks.resign_data(game_id)},
+    ])
+    rows.append(footer)
+
+    markup = CachedMarkup('{"inline_keyboard": [' + ', '.join(rows) + ']}')
+    board_markup_cache.put(key, markup)
+    return markup
 
 def main_menu_keyboard():
     keyboard = InlineKeyboardMarkup()
     keyboard.add(
-        InlineKeyboardButton("🎮 New Game", callback_data="new_game"),
-        InlineKeyboardButton("📊 Scores", callback_data="scores")
+        InlineKeyboardButton("🎮 New Game", callback_data=callbacks.NEW_GAME),
+        InlineKeyboardButton("📊 Scores", callback_data=callbacks.SCORES)
     )
     return keyboard
 
 def game_mode_keyboard():
     keyboard = InlineKeyboardMarkup()
     keyboard.add(
-        InlineKeyboardButton("👤 Play with Friend", callback_data="play_friend"),
-        InlineKeyboardButton("🤖 Play with AI", callback_data="play_ai")
+        InlineKeyboardButton("👤 Play with Friend", callback_data=callbacks.PLAY_FRIEND),
+        InlineKeyboardButton("🤖 Play with AI", callback_data=callbacks.PLAY_AI)
     )
     keyboard.add(
-        InlineKeyboardButton("⬅️ Back", callback_data="main_menu")
+        InlineKeyboardButton("⬅️ Back", callback_data=callbacks.MAIN_MENU)
+    )
+    return keyboard
+
+def ai_level_keyboard(levels):
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(*[
+        InlineKeyboardButton(name, callback_data=callbacks.ai_level_data(level))
+        for level, name in levels.items()
+    ])
+    keyboard.add(
+        InlineKeyboardButton("⬅️ Back", callback_data=callbacks.NEW_GAME)
     )
     return keyboard
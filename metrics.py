@@ -0,0 +1,237 @@
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_PORT, METRICS_LOG_INTERVAL
+
+# Upper bounds in seconds; observations above the last land in +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bot API methods timed by TimedBot; everything else passes straight through
+API_METHODS = ("send_message", "edit_message_text", "answer_callback_query", "get_chat")
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+class Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and three additions"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return float("inf")
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Metrics:
+    """Process-wide histograms, counters and gauges, keyed by name and labels"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def _get(self, table, factory, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = table.get(key)
+        if metric is None:
+            with self.lock:
+                metric = table.setdefault(key, factory())
+        return metric
+
+    def histogram(self, name, **labels):
+        return self._get(self.histograms, Histogram, name, labels)
+
+    def counter(self, name, **labels):
+        return self._get(self.counters, Counter, name, labels)
+
+    def timer(self, name, **labels):
+        return self.histogram(name, **labels).time()
+
+    def gauge(self, name, fn, **labels):
+        """Report fn() as the gauge's value each time metrics are exported"""
+        self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def record_error(self, where, error, quiet=False):
+        """Count an exception that is handled and not re-raised"""
+        self.counter("errors_total", where=where).inc()
+        if not quiet:
+            print(f"Error: {error}")
+
+    def instrument(self, cls, name, label):
+        """Time every public method of cls in histogram `name`, labelled by method name"""
+        for attr, method in list(vars(cls).items()):
+            if attr.startswith("_") or not callable(method):
+                continue
+            setattr(cls, attr, self._timed(method, self.histogram(name, **{label: attr})))
+
+    def _timed(self, method, histogram):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with histogram.time():
+                return method(*args, **kwargs)
+
+        return timed
+
+    def _gauge_values(self):
+        values = []
+        for (name, labels), fn in list(self.gauges.items()):
+            try:
+                values.append((name, labels, fn()))
+            except Exception as e:
+                self.record_error("gauge", e, quiet=True)
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            declare(name, "histogram")
+            with histogram.lock:
+                counts = list(histogram.counts)
+                total, count = histogram.sum, histogram.count
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for (name, labels), counter in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {counter.value}")
+
+        for name, labels, value in sorted(self._gauge_values()):
+            declare(name, "gauge")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One log line: count and p50/p95 per histogram, then counters and gauges"""
+        parts = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                parts.append(
+                    f"{name}{format_labels(labels)} n={histogram.count} "
+                    f"p50<={histogram.quantile(0.5) * 1000:g}ms p95<={histogram.quantile(0.95) * 1000:g}ms"
+                )
+        for (name, labels), counter in sorted(self.counters.items()):
+            parts.append(f"{name}{format_labels(labels)}={counter.value}")
+        for name, labels, value in sorted(self._gauge_values()):
+            parts.append(f"{name}{format_labels(labels)}={value}")
+        return "Metrics: " + "; ".join(parts)
+
+    def start_exporters(self, port=METRICS_PORT, log_interval=METRICS_LOG_INTERVAL):
+        """Serve /metrics on `port` and print a summary every `log_interval` seconds; 0 turns either off"""
+        if port:
+            server = ThreadingHTTPServer(("0.0.0.0", port), self._make_handler())
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        if log_interval:
+            threading.Thread(target=self._log, args=(log_interval,), name="metrics-log", daemon=True).start()
+
+    def _log(self, interval):
+        while True:
+            time.sleep(interval)
+            print(self.summary())
+
+    def _make_handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+class TimedBot:
+    """Wraps a bot so the Bot API calls in API_METHODS are timed per method"""
+
+    def __init__(self, target):
+        object.__setattr__(self, "target", target)
+        object.__setattr__(self, "histograms", {
+            method: metrics.histogram("telegram_api_seconds", method=method) for method in API_METHODS
+        })
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            return attr
+
+        def call(*args, **kwargs):
+            with histogram.time():
+                return attr(*args, **kwargs)
+
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self.target, name, value)
+
+metrics = Metrics()
@@ -0,0 +1,97 @@
+import argparse
+import mmap
+import os
+import struct
+from config import OPENING_BOOK
+from game_logic import OthelloGame, iter_squares
+
+# File layout: an 8-byte magic, a uint32 record count, then records sorted by
+# position hash. Each record is the Zobrist hash (side to move included), the
+# best square and its search score, little-endian.
+MAGIC = b"OTHBOOK1"
+HEADER = struct.Struct("<8sI")
+RECORD = struct.Struct("<QBh")
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def lookup(self, key):
+        """Return (square, score) stored for the position hash, or None"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record_key, square, score = RECORD.unpack_from(self.data, HEADER.size + mid * RECORD.size)
+            if record_key < key:
+                lo = mid + 1
+            elif record_key > key:
+                hi = mid
+            else:
+                return square, score
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+_book = None
+_book_loaded = False
+
+def get_book():
+    """The book at OPENING_BOOK, mapped on first use, or None if there is none"""
+    global _book, _book_loaded
+    if not _book_loaded:
+        _book_loaded = True
+        if OPENING_BOOK and os.path.exists(OPENING_BOOK):
+            _book = OpeningBook(OPENING_BOOK)
+    return _book
+
+def write_book(path, entries):
+    """Write {hash: (square, score)} as a sorted book file"""
+    score_limit = (1 << 15) - 1
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            square, score = entries[key]
+            f.write(RECORD.pack(key, square, max(-score_limit, min(score_limit, score))))
+
+def build_book(plies, time_budget):
+    """Search every position up to `plies` moves from the start"""
+    from ai_player import AlphaBetaAI
+
+    entries = {}
+    frontier = [OthelloGame()]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for game in frontier:
+            key = game.hash
+            if key in entries or game.is_game_over():
+                continue
+
+            ai = AlphaBetaAI(game.current_player, time_budget)
+            square = ai.search(game.copy())
+            entries[key] = (square, ai.last_score)
+
+            if ply < plies:
+                for move in iter_squares(game.get_moves_mask(game.current_player)):
+                    child = game.copy()
+                    child.make_move_square(move, game.current_player)
+                    next_frontier.append(child)
+        frontier = next_frontier
+        print(f"ply {ply}: {len(entries)} positions")
+    return entries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the AI opening book")
+    parser.add_argument("output", nargs="?", default=OPENING_BOOK)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds of search per position")
+    args = parser.parse_args()
+
+    write_book(args.output, build_book(args.plies, args.budget))
+    print(f"Book written to {args.output}")
@@ -0,0 +1,195 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from telebot.apihelper import ApiTelegramException
+from metrics import metrics
+from config import OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST
+
+MAX_ATTEMPTS = 5
+# Backoff used when a 429 carries no retry_after, doubled per attempt
+BASE_BACKOFF = 0.5
+# Per-chat buckets untouched for this long are dropped
+IDLE_BUCKET_SECONDS = 300
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def wait_time(self, now):
+        """Seconds until a token is available, refilling for the time elapsed"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+class OutboundCall:
+    def __init__(self, method, chat_id, args, kwargs, future=None, on_fail=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.on_fail = on_fail
+        self.attempts = 0
+        self.not_before = 0
+
+class Outbox:
+    """Rate-limited queue for Bot API calls.
+
+    A global and a per-chat token bucket pace the calls, and an edit of a
+    (chat_id, message_id) that is still waiting is replaced by a newer one so
+    only the latest board goes out. 429 responses are retried after the
+    delay Telegram asks for.
+    """
+
+    def __init__(self, bot=None, global_rate=OUTBOX_GLOBAL_RATE, chat_rate=OUTBOX_CHAT_RATE,
+                 chat_burst=OUTBOX_CHAT_BURST):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self.pending = OrderedDict()
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+
+    def edit_message_text(self, text, chat_id, message_id, on_fail=None, **kwargs):
+        """Queue an edit, replacing any edit of the same message not yet sent.
+
+        on_fail() is called if the edit is finally given up on.
+        """
+        key = ("edit", chat_id, message_id)
+        call = OutboundCall("edit_message_text", chat_id, (text,), dict(kwargs, chat_id=chat_id, message_id=message_id),
+                            on_fail=on_fail)
+        with self.condition:
+            if key in self.pending:
+                # Keep the queue position of the edit being replaced
+                self.coalesced += 1
+            self.pending[key] = call
+            self._wake()
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Send through the queue and wait for the result, raising any API error"""
+        return self.call("send_message", chat_id, chat_id, text, **kwargs).result()
+
+    def call(self, method, chat_id, *args, **kwargs):
+        """Queue any Bot API method; returns a Future with its result"""
+        future = Future()
+        with self.condition:
+            self.pending[("call", next(self.counter))] = OutboundCall(method, chat_id, args, kwargs, future)
+            self._wake()
+        return future
+
+    def depth(self):
+        return len(self.pending)
+
+    def _wake(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self.thread.start()
+        self.condition.notify()
+
+    def _next_ready(self, now):
+        """Pop the oldest call allowed to go now, or return the time to wait"""
+        wait = self.global_bucket.wait_time(now)
+        if wait:
+            return None, wait
+
+        wait = None
+        for key, call in self.pending.items():
+            bucket = self.chat_buckets.get(call.chat_id)
+            if bucket is None:
+                bucket = self.chat_buckets[call.chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            chat_wait = max(bucket.wait_time(now), call.not_before - now)
+            if chat_wait <= 0:
+                del self.pending[key]
+                bucket.consume()
+                self.global_bucket.consume()
+                return (key, call, bucket), 0
+            if wait is None or chat_wait < wait:
+                wait = chat_wait
+        return None, wait
+
+    def _prune_buckets(self, now):
+        idle = [chat_id for chat_id, bucket in self.chat_buckets.items()
+                if now - bucket.updated > IDLE_BUCKET_SECONDS]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    ready, wait = self._next_ready(now)
+                    if ready:
+                        break
+                    self.condition.wait(wait)
+                if now - last_prune > IDLE_BUCKET_SECONDS:
+                    self._prune_buckets(now)
+                    last_prune = now
+
+            self._send(*ready)
+
+    def _send(self, key, call, bucket):
+        call.attempts += 1
+        try:
+            result = getattr(self.bot, call.method)(*call.args, **call.kwargs)
+        except ApiTelegramException as e:
+            if e.error_code == 429 and call.attempts < MAX_ATTEMPTS:
+                self._retry(key, call, bucket, e)
+                return
+            self._fail(call, e)
+            return
+        except Exception as e:
+            self._fail(call, e)
+            return
+
+        self.sent += 1
+        if call.future:
+            call.future.set_result(result)
+
+    def _retry(self, key, call, bucket, error):
+        retry_after = (error.result_json or {}).get("parameters", {}).get("retry_after")
+        delay = retry_after if retry_after else BASE_BACKOFF * 2 ** (call.attempts - 1)
+        with self.condition:
+            self.retried += 1
+            bucket.blocked_until = time.monotonic() + delay
+            call.not_before = bucket.blocked_until
+            if key in self.pending:
+                # A newer edit of the same message arrived meanwhile and wins
+                return
+            self.pending[key] = call
+            self.pending.move_to_end(key, last=False)
+            self.condition.notify()
+
+    def _fail(self, call, error):
+        if call.future:
+            call.future.set_exception(error)
+            return
+        if "message is not modified" in str(error):
+            return
+        self.failed += 1
+        metrics.record_error("outbox", f"{call.method} to {call.chat_id} failed: {error}")
+        if call.on_fail:
+            call.on_fail()
+
+outbox = Outbox()
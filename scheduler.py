@@ -0,0 +1,65 @@
+import heapq
+import itertools
+import threading
+import time
+from metrics import metrics
+
+class Scheduler:
+    """Runs callables at a given time on one background thread.
+
+    Tasks due at the same moment run in the order they were scheduled, and
+    since a single thread runs them, tasks sharing a key (a game id) never
+    overlap or reorder.
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        # Hands a due task over for execution; the asyncio runtime replaces
+        # it to run tasks on the game's ordered queue instead of this thread
+        self.dispatch = self.run_task
+
+    def schedule(self, delay, fn, *args, key=None):
+        self.schedule_at(time.monotonic() + delay, fn, *args, key=key)
+
+    def schedule_at(self, due, fn, *args, key=None):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+                self.thread.start()
+            heapq.heappush(self.queue, (due, next(self.counter), key, fn, args))
+            self.condition.notify()
+
+    def cancel(self, key):
+        """Drop every pending task scheduled with `key`"""
+        with self.condition:
+            self.queue = [task for task in self.queue if task[2] != key]
+            heapq.heapify(self.queue)
+
+    def pending(self):
+        return len(self.queue)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.queue:
+                        self.condition.wait()
+                        continue
+                    wait = self.queue[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                _, _, key, fn, args = heapq.heappop(self.queue)
+
+            self.dispatch(key, fn, args)
+
+    def run_task(self, key, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            metrics.record_error("scheduled_task", e)
+
+scheduler = Scheduler()
@@ -0,0 +1,77 @@
+from array import array
+from config import TT_SIZE_MB
+
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+NO_MOVE = 255
+
+# Each slot is a key word and a data word. The key is stored XOR-ed with the
+# data so a slot torn by two threads writing at once simply fails to match.
+SLOT_BYTES = 16
+SCORE_OFFSET = 1 << 31
+
+class TranspositionTable:
+    def __init__(self, size_mb=TT_SIZE_MB):
+        slots = max(2, (size_mb << 20) // SLOT_BYTES)
+        # Round down to a power of two and pair slots into buckets: the first
+        # slot of a bucket prefers deeper results, the second always replaces
+        buckets = 1 << ((slots // 2).bit_length() - 1)
+        self.bucket_mask = buckets - 1
+        self.keys = array('Q', [0]) * (buckets * 2)
+        self.data = array('Q', [0]) * (buckets * 2)
+        self.generation = 0
+
+    def new_search(self):
+        """Mark existing entries as aged so they are the first to be replaced"""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        size = len(self.keys)
+        self.keys = array('Q', [0]) * size
+        self.data = array('Q', [0]) * size
+        self.generation = 0
+
+    def probe(self, key):
+        """Return (depth, bound, score, move) stored for `key`, or None"""
+        slot = (key & self.bucket_mask) << 1
+        for index in (slot, slot + 1):
+            data = self.data[index]
+            if data and self.keys[index] ^ data == key:
+                return (
+                    (data >> 8) & 0xFF,
+                    (data >> 16) & 0xFF,
+                    (data >> 32) - SCORE_OFFSET,
+                    data & 0xFF,
+                )
+        return None
+
+    def store(self, key, depth, bound, score, move=NO_MOVE):
+        data = (
+            move
+            | depth << 8
+            | bound << 16
+            | self.generation << 24
+            | (score + SCORE_OFFSET) << 32
+        )
+        slot = (key & self.bucket_mask) << 1
+
+        old = self.data[slot]
+        if (
+            not old
+            or self.keys[slot] ^ old == key
+            or depth >= (old >> 8) & 0xFF
+            or (old >> 24) & 0xFF != self.generation
+        ):
+            index = slot
+        else:
+            index = slot + 1
+
+        self.data[index] = data
+        self.keys[index] = key ^ data
+
+    def memory_usage(self):
+        return len(self.keys) * SLOT_BYTES
+
+shared_table = TranspositionTable()
@@ -0,0 +1,166 @@
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot.types import Update
+import bot as app
+from metrics import metrics
+from config import (
+    WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, WEBHOOK_BATCH_SIZE
+)
+
+WEBHOOK_PATH = "/telegram"
+
+class WebhookServer:
+    """Accepts Telegram updates over HTTP and feeds them to the bot's handlers.
+
+    Request threads only parse and enqueue; a fixed set of workers drains
+    the queue in batches. When the queue is full the server answers 503
+    so Telegram holds the update and retries later.
+    """
+
+    def __init__(self, bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT, secret=WEBHOOK_SECRET,
+                 workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE, batch_size=WEBHOOK_BATCH_SIZE):
+        self.bot = bot
+        self.secret = secret
+        self.workers = workers
+        self.batch_size = batch_size
+        self.updates = queue.Queue(maxsize=queue_size)
+        # Serialises producers so a batch's room check and its puts are one step
+        self.enqueue_lock = threading.Lock()
+        self.rejected = 0
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.threads = []
+
+    @property
+    def server_address(self):
+        return self.server.server_address
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"webhook-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        thread = threading.Thread(target=self.server.serve_forever, name="webhook-http", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.enqueue_lock:
+            for _ in range(self.workers):
+                self.updates.put(None)
+
+    def depth(self):
+        return self.updates.qsize()
+
+    def enqueue(self, payload):
+        """Queue one update dict or a list of them; False, queueing none, if there is no room for all"""
+        items = payload if isinstance(payload, list) else [payload]
+        with self.enqueue_lock:
+            # Workers only ever free space, so the room checked here is still there for the puts
+            if self.updates.maxsize > 0 and self.updates.maxsize - self.updates.qsize() < len(items):
+                self.rejected += 1
+                return False
+            for item in items:
+                self.updates.put_nowait(item)
+        return True
+
+    def _work(self):
+        while True:
+            batch = []
+            stopping = False
+            item = self.updates.get()
+            while True:
+                if item is None:
+                    # Take only our own sentinel; the other workers need theirs
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.updates.get_nowait()
+                except queue.Empty:
+                    break
+
+            # One at a time: with threaded=False a handler error aborts the rest
+            # of process_new_updates, and these updates were already answered 200
+            for item in batch:
+                try:
+                    self.bot.process_new_updates([Update.de_json(item)])
+                except Exception as e:
+                    metrics.record_error("webhook", e)
+            if stopping:
+                return
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # Health check for load balancers
+                self._reply(200, b"ok")
+
+            def do_POST(self):
+                if self.path != WEBHOOK_PATH:
+                    self._reply(404, b"not found")
+                    return
+                if server.secret and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != server.secret:
+                    self._reply(403, b"forbidden")
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._reply(400, b"bad request")
+                    return
+
+                if server.enqueue(payload):
+                    self._reply(200, b"ok")
+                else:
+                    self._reply(503, b"busy")
+
+            def _reply(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def run():
+    if not WEBHOOK_URL:
+        raise SystemExit("Set WEBHOOK_URL to the public https URL Telegram should post to")
+
+    # Handlers run on the server's own bounded workers, not telebot's pool
+    app.bot.threaded = False
+    server = WebhookServer(app.bot)
+    server.start()
+    metrics.gauge("webhook_queue_depth", server.depth)
+
+    app.bot.remove_webhook()
+    app.bot.set_webhook(
+        url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_WORKERS * 5
+    )
+
+    threading.Thread(target=app.restore_hot_state, name="restore", daemon=True).start()
+    metrics.start_exporters()
+    print(f"Bot started (webhook on {WEBHOOK_HOST}:{WEBHOOK_PORT})")
+    try:
+        threading.Event().wait()
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    run()